@@ -0,0 +1,139 @@
+# kubernetes quantity arithmetic, a faster drop-in for kubernetes.utils.quantity.parse_quantity
+# quantities are parsed exactly the same way, see:
+# https://github.com/kubernetes-client/python/blob/v12.0.1/kubernetes/utils/quantity.py
+
+import re
+import functools
+from decimal import Decimal, InvalidOperation
+
+# suffix exponents, base is 1024 for binary ("i" suffixed) and 1000 for decimal suffixes
+EXPONENTS = { "n": -3, "u": -2, "m": -1, "K": 1, "k": 1, "M": 2, "G": 3, "T": 4, "P": 5, "E": 6 }
+
+# whole number with an optional suffix of at least milli, which is a whole amount of milli-units
+WHOLE_MILLI_QUANTITY_REGEX = re.compile(r"^([0-9]+)(m|k|K|M|G|T|P|E|Ki|Mi|Gi|Ti|Pi|Ei)?$")
+
+# integers below this limit fit into the default decimal precision (28 digits) and are therefore exact
+EXACT_INTEGER_LIMIT = 10 ** 28
+
+def split(quantity):
+
+    # separate number from suffix (none if there is no suffix)
+    if len(quantity) >= 2 and quantity[-1] == "i":
+        if quantity[-2] in EXPONENTS:
+            return quantity[:-2], quantity[-2:]
+    elif len(quantity) >= 1 and quantity[-1] in EXPONENTS:
+        return quantity[:-1], quantity[-1:]
+
+    return quantity, None
+
+@functools.lru_cache(maxsize=None)
+def multiplier(suffix):
+
+    # decimal multiplier of given suffix, blank suffix stands for a plain number
+    if not suffix:
+        return Decimal(1)
+
+    if suffix.endswith("i"):
+        base = 1024
+    elif len(suffix) == 1:
+        base = 1000
+    else:
+        raise ValueError(f"{suffix} is an unknown suffix")
+
+    # handle SI inconsistency
+    if suffix == "ki" or suffix[0] not in EXPONENTS:
+        raise ValueError(f"{suffix} is an unknown suffix")
+
+    return base ** Decimal(EXPONENTS[suffix[0]])
+
+@functools.lru_cache(maxsize=None)
+def milli_multiplier(suffix):
+
+    # integer amount of milli-units per one unit of given suffix (none for suffixes smaller than milli)
+    value = multiplier(suffix) * 1000
+    return int(value) if value == value.to_integral_value() else None
+
+@functools.lru_cache(maxsize=4096)
+def parse_quantity(quantity):
+
+    # numeric input is already a plain number
+    if isinstance(quantity, (int, float, Decimal)):
+        return Decimal(quantity)
+
+    quantity = str(quantity)
+    number, suffix = split(quantity)
+
+    try:
+        number = Decimal(number)
+    except InvalidOperation:
+        raise ValueError(f"Invalid number format: {number}")
+
+    if suffix is None:
+        return number
+
+    try:
+        return number * multiplier(suffix)
+    except ValueError:
+        raise ValueError(f"{quantity} has unknown suffix")
+
+@functools.lru_cache(maxsize=4096)
+def to_milli(quantity):
+
+    # fast path - whole number with a common suffix
+    match = WHOLE_MILLI_QUANTITY_REGEX.match(quantity)
+    if match:
+        milli = int(match.group(1)) * milli_multiplier(match.group(2) or "")
+        if milli < EXACT_INTEGER_LIMIT:
+            return milli
+
+    # fall back to decimal arithmetic, quantity might not be a whole amount of milli-units (or might be too large)
+    value = parse_quantity(quantity) * 1000
+    return int(value) if value == value.to_integral_value() else None
+
+def compare(first, second):
+
+    # compare as integers whenever possible
+    first_milli, second_milli = to_milli(first), to_milli(second)
+    if first_milli is not None and second_milli is not None:
+        return (first_milli > second_milli) - (first_milli < second_milli)
+
+    return int(parse_quantity(first).compare(parse_quantity(second)))
+
+def total(quantities):
+
+    # sum whole amounts of milli-units as integers, the rest as decimals
+    total_milli = 0
+    total_decimal = Decimal(0)
+    for quantity in quantities:
+        milli = to_milli(quantity)
+        if milli is not None:
+            total_milli += milli
+        else:
+            total_decimal += parse_quantity(quantity)
+
+    return total_decimal + Decimal(total_milli) / 1000
+
+def normalize(decimal):
+
+    # strip trailing zeroes and format as float
+    return '{:f}'.format(decimal.normalize())
+
+def express(decimal, units):
+
+    # plain number expressed in given units
+    return normalize(decimal / multiplier(units))
+
+def convert(quantity, units):
+
+    # whole quantities which divide evenly by the units are converted as integers
+    milli = to_milli(quantity)
+    units_milli = milli_multiplier(units)
+    if milli is not None and units_milli is not None and milli < EXACT_INTEGER_LIMIT and milli % units_milli == 0:
+        return str(milli // units_milli)
+
+    return express(parse_quantity(quantity), units)
+
+def convert_quota(quantities, units):
+
+    # convert a whole quota object (parameter:quantity) to units of each parameter (parameter:units)
+    return { parameter:convert(quantity, units[parameter]) for parameter, quantity in quantities.items() }
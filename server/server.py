@@ -1,5 +1,14 @@
 #!/usr/bin/env python3
 
+# imports are timed as the first phase of the startup report
+import time
+PROCESS_START = time.monotonic()
+
+# make blocking standard library calls (sockets, ssl, locks) cooperative
+# so that greenlets can share pooled upstream connections safely
+from gevent import monkey
+monkey.patch_all()
+
 import flask
 import requests
 import logging
@@ -10,16 +19,77 @@ import re
 import shutil
 import glob
 import bisect
-from datetime import datetime
-from logging.handlers import RotatingFileHandler, BaseRotatingHandler
+import hashlib
+import collections
+import sqlite3
+import socket
+import heapq
+import gevent
+import functools
+import gevent.pool
+import gevent.socket
+import gevent.event
+import gevent.queue
+import greenlet
+import gzip
+import mimetypes
+import contextlib
+import cProfile
+import csv
+import io
+import codecs
+import base64
+import itertools
+import random
+from datetime import datetime, timezone
 from flask import g as request_context
-from kubernetes.utils.quantity import parse_quantity
+import quantity
+import prometheus_client
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
 from gevent.pywsgi import WSGIServer, WSGIHandler
-from werkzeug.exceptions import BadRequest
+from werkzeug.exceptions import BadRequest, HTTPException, NotFound
+
+# brotli is optional, responses are compressed using gzip only when it is missing
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# httpx is optional, it is required by the http/2 upstream engine only
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# inotify is optional, configuration directories are polled when it is missing
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+IMPORTS_FINISHED = time.monotonic()
 
 # constants
 QUOTA_LOGFORMATTER = logging.Formatter('[%(asctime)s] - %(name)s - %(levelname)s - %(message)s')
-INFRA_PROJECTS_REGEX = r"(^openshift-|^kube-|^openshift$|^default$)"
+INFRA_PROJECTS_REGEX = re.compile(r"(^openshift-|^kube-|^openshift$|^default$)")
+LOCAL_API = "https://openshift.default.svc:443"
+LOCAL_CLUSTER_LABEL = "<local>"
+UI_DIR = "../ui"
+HASHED_ASSET_REGEX = re.compile(r"\.[0-9a-f]{8,}\.")
+API_PREFIX_REGEX = re.compile(r"^/(api/[^/]+|apis/[^/]+/[^/]+)")
+# metadata of listed (or watched) objects only, servers which do not support it fall back to whole objects
+PARTIAL_METADATA_LIST_ACCEPT = "application/json;as=PartialObjectMetadataList;g=meta.k8s.io;v=v1,application/json"
+PARTIAL_METADATA_WATCH_ACCEPT = "application/json;as=PartialObjectMetadata;g=meta.k8s.io;v=v1,application/json"
+LIST_CHUNK_SIZE = 64 * 1024
+COMPRESSIBLE_MIMETYPES = [ "application/json", "application/javascript", "text/javascript", "text/html", "text/css", "text/plain", "image/svg+xml", "image/x-icon", "image/vnd.microsoft.icon" ]
+
+# metrics
+REQUEST_LATENCY = prometheus_client.Histogram("quota_management_request_duration_seconds", "Latency of handled requests", [ "endpoint", "method", "status" ])
+REQUESTS_IN_FLIGHT = prometheus_client.Gauge("quota_management_requests_in_flight", "Requests (greenlets) currently being handled")
+UPSTREAM_LATENCY = prometheus_client.Histogram("quota_management_upstream_request_duration_seconds", "Latency of requests to the API servers", [ "cluster", "verb", "route" ], buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60))
+UPSTREAM_ERRORS = prometheus_client.Counter("quota_management_upstream_request_errors_total", "Failed requests to the API servers", [ "cluster", "verb", "route", "reason" ])
+UPSTREAM_READS = prometheus_client.Counter("quota_management_upstream_reads_total", "GET requests to the API servers, by whether they were sent, joined an identical in-flight request or were answered from the micro-cache", [ "cluster", "result" ])
+UPSTREAM_IN_FLIGHT = prometheus_client.Gauge("quota_management_upstream_requests_in_flight", "Requests to the API servers currently waiting for a response", [ "cluster" ])
 
 def get_logger(name):
 
@@ -29,15 +99,103 @@ def get_logger(name):
             if record.levelno is logging.CRITICAL:
                 raise SystemExit(-1)
 
-    # set up handler with formatting
+    # set up handler with formatting (once, loggers are shared by name)
     logger = logging.getLogger(name)
-    logger.setLevel(logging.DEBUG)
-    log_handler = ExitOnExceptionHandler()
-    log_handler.setFormatter(QUOTA_LOGFORMATTER)
-    logger.addHandler(log_handler)
+    if not logger.handlers:
+        logger.setLevel(logging.DEBUG)
+        log_handler = ExitOnExceptionHandler()
+        log_handler.setFormatter(QUOTA_LOGFORMATTER)
+        logger.addHandler(log_handler)
 
     return logger
 
+class ConfigError(Exception):
+    pass
+
+class StartupReport:
+
+    def __init__(self):
+
+        # duration of each startup phase, in order
+        self.phases = { "imports": IMPORTS_FINISHED - PROCESS_START }
+        self.last_mark = IMPORTS_FINISHED
+        self.ready_after = None
+
+    def mark(self, phase):
+
+        # phase has lasted since the previous mark
+        now = time.monotonic()
+        self.phases[phase] = now - self.last_mark
+        self.last_mark = now
+
+    def add(self, phase, duration):
+
+        # phase which has run in the background
+        self.phases[phase] = duration
+
+    def ready(self):
+        self.ready_after = time.monotonic() - PROCESS_START
+
+    def format(self):
+        return ", ".join(f"{phase} {duration:.3f}s" for phase, duration in self.phases.items())
+
+    def stats(self):
+        return {
+            "phases": { phase: round(duration, 3) for phase, duration in self.phases.items() },
+            "ready_after": round(self.ready_after, 3) if self.ready_after is not None else None
+        }
+
+def read_config_files(directory, kind):
+
+    # ensure dir exists
+    if not os.path.exists(directory):
+        raise ConfigError(f"{kind}s directory is not present at '{directory}'")
+
+    def read_config_file(name):
+        with open(os.path.join(directory, name)) as config_file:
+            return config_file.read()
+
+    # read all of the files at once using native threads (file reads are not cooperative),
+    # ignoring hidden files (and directories mounted by kubernetes)
+    names = [ name for name in os.listdir(directory) if not name.startswith(".") ]
+    contents = gevent.get_hub().threadpool.map(read_config_file, names)
+
+    # parse each file
+    config_files = {}
+    for name, content in zip(names, contents):
+        try:
+            config_files[name] = json.loads(content)
+        except json.JSONDecodeError as error:
+            raise ConfigError(f"could not parse '{name}' {kind} file: {error}")
+
+    return config_files
+
+@functools.lru_cache(maxsize=None)
+def compile_pattern(pattern):
+    return re.compile(pattern)
+
+def pattern_validator(validator, pattern, instance, schema):
+
+    # same as the original 'pattern' keyword, minus compiling the pattern on every call
+    if validator.is_type(instance, "string") and not compile_pattern(pattern).search(instance):
+        yield jsonschema.ValidationError(f"{instance!r} does not match {pattern!r}")
+
+# draft 7 validator (default of jsonschema.validate) with cached regex patterns
+CachedPatternValidator = jsonschema.validators.extend(jsonschema.Draft7Validator, { "pattern": pattern_validator })
+
+def compile_validator(schema):
+
+    # check schema once, validator object is reused for every instance
+    CachedPatternValidator.check_schema(schema)
+    return CachedPatternValidator(schema)
+
+def validate_instance(validator, instance):
+
+    # raise the most relevant error, same as jsonschema.validate
+    error = jsonschema.exceptions.best_match(validator.iter_errors(instance))
+    if error is not None:
+        raise error
+
 class CustomWSGIHandler(WSGIHandler):
 
     def log_request(self):
@@ -68,58 +226,1236 @@ class CustomWSGIHandler(WSGIHandler):
             length,
             delta)
 
-class QuotaLogFileHandler(RotatingFileHandler):
+class AuditIndex:
 
-    def __init__(self, log_dir, maxBytes=(1024 * 1024), encoding=None):
-        
-        # slightly edited version of the super method
-        # original method can be seen here:
-        # https://github.com/python/cpython/blob/4560c7e605887fda3af63f8ce157abf94954d4d2/Lib/logging/handlers.py#L124
+    # structured audit records of a single pod, queried by project, user, cluster and time
+    # (rollback journal rather than wal - the log storage is shared by pods on different nodes)
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS audit (time REAL NOT NULL, user TEXT NOT NULL, project TEXT NOT NULL, cluster TEXT NOT NULL, action TEXT NOT NULL, message TEXT NOT NULL, details TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS audit_time ON audit (time)",
+        "CREATE INDEX IF NOT EXISTS audit_project ON audit (project, time)",
+        "CREATE INDEX IF NOT EXISTS audit_user ON audit (user, time)",
+        "CREATE INDEX IF NOT EXISTS audit_cluster ON audit (cluster, time)"
+    ]
+    FILTERS = [ "project", "user", "cluster" ]
+
+    def __init__(self, log_dir):
+        self.path = os.path.join(log_dir, f"audit-{socket.gethostname()}.sqlite")
+        self.connection = None
+
+    def connect(self):
+
+        # connection belongs to the thread which opens it (the writer thread)
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            for statement in self.SCHEMA:
+                self.connection.execute(statement)
+
+        return self.connection
+
+    def insert(self, records):
+        with self.connect() as connection:
+            connection.executemany("INSERT INTO audit VALUES (?, ?, ?, ?, ?, ?, ?)", records)
+
+    def prune(self, before):
+
+        # forget records older than the oldest remaining log file
+        with self.connect() as connection:
+            connection.execute("DELETE FROM audit WHERE time < ?", (before,))
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+
+    @classmethod
+    def query(cls, log_dir, filters, since, until, limit):
+
+        # indexes of all of the pods sharing the log storage are queried, newest records first
+        conditions = [ f"{name} = ?" for name in cls.FILTERS if filters.get(name) ] + [ "time >= ?", "time < ?" ]
+        params = [ filters[name] for name in cls.FILTERS if filters.get(name) ] + [ since, until, limit ]
+        statement = f"SELECT time, user, project, cluster, action, message, details FROM audit WHERE {' AND '.join(conditions)} ORDER BY time DESC LIMIT ?"
+
+        results = []
+        for path in glob.glob(os.path.join(log_dir, "audit-*.sqlite")):
+            connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            try:
+                results.append(connection.execute(statement, params).fetchall())
+            except sqlite3.Error:
+                continue
+            finally:
+                connection.close()
+
+        return list(heapq.merge(*results, key=lambda row: row[0], reverse=True))[:limit]
+
+class QuotaLogFileHandler(logging.Handler):
+
+    def __init__(self, log_dir, logger, maxBytes=(1024 * 1024), queue_size=10000, batch_size=512):
+
+        # records are formatted by the caller and written to rotated files by a dedicated native thread,
+        # so that a slow persistent volume does not stall the gevent loop
+        # (queue, lock and thread are the original, non-cooperative ones)
+        super(QuotaLogFileHandler, self).__init__()
+        self.setFormatter(QUOTA_LOGFORMATTER)
 
         self.originalFileName = os.path.join(log_dir, "quota.log")
+        self.logger = logger
         self.maxBytes = maxBytes
-        self.setFormatter(QUOTA_LOGFORMATTER)
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.queue = monkey.get_original("queue", "SimpleQueue")()
+        self.writer_finished = monkey.get_original("_thread", "allocate_lock")()
 
-        self.free_disk_space()
-        BaseRotatingHandler.__init__(self, self.get_new_filename(), 'a', encoding, False)
+        # records logged with extra={"audit": ...} are indexed along with being written to the log file
+        self.audit_index = AuditIndex(log_dir)
+
+        # statistics
+        self.records = 0
+        self.audit_records = 0
+        self.batches = 0
+        self.rollovers = 0
+        self.backpressure_waits = 0
+        self.backpressure_seconds = 0.0
+
+        # existing log files are indexed (oldest first) once, rotation keeps the index up to date
+        self.log_files = collections.deque(sorted(glob.glob(f"{self.originalFileName}*"), key=os.path.getctime))
+        self.stream = None
+        self.bytes_written = 0
+        self.doRollover()
+
+        self.writer_finished.acquire()
+        monkey.get_original("_thread", "start_new_thread")(self.write_records, ())
+
+    def emit(self, record):
+
+        try:
+            audit = getattr(record, "audit", None)
+            self.queue.put(( self.format(record) + "\n", ( record.created, audit["user"], audit["project"], audit["cluster"], audit["action"], record.getMessage(), json.dumps(audit["details"]) ) if audit else None ))
+        except Exception:
+            self.handleError(record)
+            return
+
+        # writer falls behind - hold the logging greenlet back (other greenlets keep running) until the queue drains
+        if self.queue.qsize() > self.queue_size:
+            self.backpressure_waits += 1
+            start = time.monotonic()
+            while self.queue.qsize() > self.queue_size:
+                gevent.sleep(0.005)
+            self.backpressure_seconds += time.monotonic() - start
+
+    def write_records(self):
+
+        # runs in the writer thread
+        try:
+            while True:
+
+                # wait for the next record, then take whatever else is already queued
+                batch = [ self.queue.get() ]
+                while len(batch) < self.batch_size and not self.queue.empty():
+                    batch.append(self.queue.get())
+
+                closing = None in batch
+                lines = [ item[0] for item in batch if item is not None ]
+                audit_records = [ item[1] for item in batch if item is not None and item[1] is not None ]
+
+                # failed batch is reported by a logger not writing to this handler, the writer keeps going
+                try:
+                    self.write_lines(lines)
+                except Exception as error:
+                    self.logger.error(f"could not write {len(lines)} log records: {error}")
+
+                # audit records are indexed once they are safely in the log file
+                try:
+                    if audit_records:
+                        self.audit_index.insert(audit_records)
+                        self.audit_records += len(audit_records)
+                except Exception as error:
+                    self.logger.error(f"could not index {len(audit_records)} audit records: {error}")
+
+                if closing:
+                    break
+        finally:
+            self.stream.close()
+            self.audit_index.close()
+            self.writer_finished.release()
+
+    def write_lines(self, lines):
+
+        # write lines in as few writes as possible, rolling the file over whenever it would exceed max size
+        chunk = []
+        chunk_size = 0
+        for line in lines:
+            if self.bytes_written + chunk_size + len(line) >= self.maxBytes and self.bytes_written + chunk_size > 0:
+                self.write_chunk(chunk, chunk_size)
+                self.doRollover()
+                chunk = []
+                chunk_size = 0
+
+            chunk.append(line)
+            chunk_size += len(line)
+
+        if chunk:
+            self.write_chunk(chunk, chunk_size)
+
+    def write_chunk(self, chunk, chunk_size):
+
+        if chunk:
+            self.stream.write("".join(chunk))
+            self.stream.flush()
+            self.bytes_written += chunk_size
+            self.records += len(chunk)
+            self.batches += 1
+
+    def close(self):
+
+        # let the writer drain the queue before closing
+        if self.writer_finished.locked():
+            self.queue.put(None)
+            self.writer_finished.acquire(timeout=5)
+
+        super(QuotaLogFileHandler, self).close()
 
     def doRollover(self):
-        
-        # slightly edited version of the super method
-        # original method can be seen here:
-        # https://github.com/python/cpython/blob/4560c7e605887fda3af63f8ce157abf94954d4d2/Lib/logging/handlers.py#L158
 
+        # each log file gets a new name, previous files are never renamed
         if self.stream:
             self.stream.close()
-            self.stream = None
+            self.rollovers += 1
 
-        # record is always logged to path stored in "baseFilename"
-        # the original RotatingFileHandler would rename and therefore store current file aside
-        # here we just overwrite the current "baseFilename" to the new file name
-        self.baseFilename = self.get_new_filename()
+        path = self.get_new_filename()
         self.free_disk_space()
-
-        self.stream = self._open()
+        self.stream = open(path, "a")
+        self.log_files.append(path)
+        self.bytes_written = 0
 
     def get_new_filename(self):
         return f"{self.originalFileName}_{datetime.now().strftime('%d-%m-%Y_%H-%M-%S-%f')}"
 
-    def free_disk_space(self):
+    def free_disk_space(self):
+
+        # calculate max amount of log files
+        total_disk_space, _, free_disk_space = shutil.disk_usage(os.path.dirname(self.originalFileName))
+        maxFiles = int(total_disk_space / self.maxBytes) - 1
+
+        # log storage is shared with other pods, whose files are not in the index - re-index once the disk is running out of space
+        if free_disk_space < 2 * self.maxBytes:
+            self.log_files = collections.deque(sorted(glob.glob(f"{self.originalFileName}*"), key=os.path.getctime))
+
+        # if max amount of log files reached - delete oldest log file
+        removed = False
+        while len(self.log_files) >= maxFiles:
+
+            if len(self.log_files) == 0:
+                raise Exception("not enough disk space for an additional log file")
+
+            path = self.log_files.popleft()
+            if os.path.exists(path):
+                os.remove(path)
+            removed = True
+
+        # audit history goes as far back as the log files do
+        if removed and self.log_files and os.path.exists(self.log_files[0]):
+            self.audit_index.prune(os.path.getctime(self.log_files[0]))
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize(),
+            "records": self.records,
+            "audit_records": self.audit_records,
+            "batches": self.batches,
+            "rollovers": self.rollovers,
+            "files": len(self.log_files),
+            "backpressure_waits": self.backpressure_waits,
+            "backpressure_seconds": round(self.backpressure_seconds, 3)
+        }
+
+class PooledHTTPAdapter(requests.adapters.HTTPAdapter):
+
+    def __init__(self, pool_size, pool_timeout):
+
+        # each adapter talks to a single API server, greenlets wait (up to pool timeout) for a free connection once the pool is exhausted
+        self.pool_timeout = pool_timeout
+        super(PooledHTTPAdapter, self).__init__(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+
+        self.pool_size = pool_size
+        self.requests = 0
+        self.waits = 0
+        self.connection_pools = set()
+
+    def send(self, request, **kwargs):
+
+        # remember connection pool in order to collect statistics later on
+        connection_pool = self.get_connection(request.url, kwargs.get("proxies"))
+        self.connection_pools.add(connection_pool)
+
+        # all pooled connections are currently in use - request will wait for one to be released
+        if connection_pool.pool is not None and connection_pool.pool.empty():
+            self.waits += 1
+
+        self.requests += 1
+
+        try:
+            return super(PooledHTTPAdapter, self).send(request, **kwargs)
+
+        # requests does not translate this one
+        except requests.packages.urllib3.exceptions.EmptyPoolError:
+            raise requests.exceptions.ConnectionError(f"no connection to the API server was freed within {self.pool_timeout} seconds", request=request)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(PooledHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+
+        # requests does not pass a pool timeout to connection pools, which would make greenlets wait for a free connection indefinitely
+        pool_timeout = self.pool_timeout
+
+        class BoundedWait:
+            def urlopen(self, *args, **kwargs):
+                kwargs.setdefault("pool_timeout", pool_timeout)
+                return super(BoundedWait, self).urlopen(*args, **kwargs)
+
+        self.poolmanager.pool_classes_by_scheme = { scheme: type(pool_class.__name__, ( BoundedWait, pool_class ), {})
+                                                        for scheme, pool_class in self.poolmanager.pool_classes_by_scheme.items() }
+
+    def stats(self):
+
+        # every request that did not open a new connection reused a kept-alive one
+        new_connections = sum(connection_pool.num_connections for connection_pool in self.connection_pools)
+
+        return {
+            "size": self.pool_size,
+            "requests": self.requests,
+            "hits": self.requests - new_connections,
+            "new_connections": new_connections,
+            "waits": self.waits
+        }
+
+class RequestsEngine:
+
+    def __init__(self, token, pool_size, pool_timeout, verify):
+
+        # session keeps connections to the API server alive between requests (one request per connection at a time)
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {token}",
+            "Accept": "application/json"
+        })
+        self.verify = verify
+
+        # share the same connection pool for both schemes
+        self.adapter = PooledHTTPAdapter(pool_size, pool_timeout)
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+
+    def request(self, method, url, headers, timeout, **kwargs):
+        return self.session.request(method, url, headers=headers, timeout=timeout, verify=self.verify, **kwargs)
+
+    def stats(self):
+        return self.adapter.stats()
+
+    def close(self):
+        self.session.close()
+
+class HTTPXResponse:
+
+    # subset of requests.Response interface used throughout the server
+    def __init__(self, response):
+        self.response = response
+
+    @property
+    def status_code(self):
+        return self.response.status_code
+
+    @property
+    def content(self):
+        try:
+            return self.response.read()
+        except httpx.HTTPError as error:
+            raise HTTPXEngine.translate_error(error)
+
+    def json(self):
+        self.content
+        return self.response.json()
+
+    def iter_lines(self):
+        try:
+            yield from self.response.iter_lines()
+        except httpx.HTTPError as error:
+            raise HTTPXEngine.translate_error(error)
+
+    def iter_content(self, chunk_size):
+        try:
+            yield from self.response.iter_bytes(chunk_size)
+        except httpx.HTTPError as error:
+            raise HTTPXEngine.translate_error(error)
+
+    def raise_for_status(self):
+        if self.response.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.response.status_code} error for url: {self.response.url}", response=self)
+
+    def close(self):
+        self.response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class HTTPXEngine:
+
+    def __init__(self, token, pool_size, pool_timeout, verify):
+
+        # concurrent requests share a single multiplexed http/2 connection (the API server falls back to http/1.1 pooling otherwise)
+        # sync client is used on purpose - sockets are cooperative under gevent, so each greenlet waits for its own stream only
+        self.client = httpx.Client(
+            http2=True,
+            verify=verify,
+            headers={
+                "Authorization": f"Bearer {token}",
+                "Accept": "application/json"
+            },
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size))
+
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        self.requests = 0
+        self.http2_requests = 0
+        self.new_connections = self.track_new_connections()
+
+    def track_new_connections(self):
+
+        # count opened connections - the connection pool of the transport is not exposed, so this relies on httpx internals
+        # and is given up (connection reuse is not reported) rather than failing once they change
+        try:
+            connection_pool = self.client._transport._pool
+            create_connection = connection_pool.create_connection
+        except AttributeError:
+            return None
+
+        def count_new_connection(*args, **kwargs):
+            self.new_connections += 1
+            return create_connection(*args, **kwargs)
+
+        connection_pool.create_connection = count_new_connection
+        return 0
+
+    @staticmethod
+    def translate_error(error):
+
+        # map to requests exceptions, so that error handling stays the same for both engines
+        if isinstance(error, httpx.TimeoutException):
+            return requests.exceptions.Timeout(str(error))
+        if isinstance(error, httpx.TransportError):
+            return requests.exceptions.ConnectionError(str(error))
+
+        return requests.exceptions.RequestException(str(error))
+
+    def request(self, method, url, headers, timeout, stream=False, **kwargs):
+
+        # requests style (connect, read) timeout tuple
+        if isinstance(timeout, tuple):
+            timeout = httpx.Timeout(timeout[1], connect=timeout[0], pool=self.pool_timeout)
+        else:
+            timeout = httpx.Timeout(timeout, pool=self.pool_timeout)
+
+        try:
+            response = self.client.send(self.client.build_request(method, url, headers=headers, timeout=timeout, **kwargs), stream=stream)
+        except httpx.HTTPError as error:
+            raise self.translate_error(error)
+
+        self.requests += 1
+        self.http2_requests += response.http_version == "HTTP/2"
+
+        return HTTPXResponse(response)
+
+    def stats(self):
+        return {
+            "size": self.pool_size,
+            "requests": self.requests,
+            "hits": self.requests - self.new_connections if self.new_connections is not None else None,
+            "new_connections": self.new_connections,
+            "waits": None,
+            "http2_requests": self.http2_requests
+        }
+
+    def close(self):
+        self.client.close()
+
+UPSTREAM_ENGINES = { "requests": RequestsEngine, "httpx": HTTPXEngine }
+
+class ExpiringCache:
+
+    def __init__(self, max_size, ttl):
+
+        # entries are kept in least recently used order
+        self.entries = collections.OrderedDict()
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def __getitem__(self, key):
+
+        # entry is missing or has expired
+        if key not in self.entries or self.entries[key][1] <= time.monotonic():
+            self.entries.pop(key, None)
+            self.misses += 1
+            raise KeyError(key)
+
+        # mark entry as recently used
+        self.entries.move_to_end(key)
+        self.hits += 1
+
+        return self.entries[key][0]
+
+    def set(self, key, value, ttl=None):
+
+        ttl = self.ttl if ttl is None else ttl
+
+        # caching is disabled for non-positive expiry
+        if ttl <= 0:
+            return
+
+        self.entries[key] = ( value, time.monotonic() + ttl )
+        self.entries.move_to_end(key)
+
+        # evict least recently used entries
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+class SingleFlight:
+
+    def __init__(self, ttl):
+
+        # identical concurrent reads share a single upstream request, completed results are optionally kept for a short while
+        self.in_flight = {}
+        self.results = ExpiringCache(1024, ttl)
+        self.ttl = ttl
+        self.sent = 0
+        self.coalesced = 0
+        self.cached = 0
+
+    def do(self, key, label, function):
+
+        # answer from micro-cache
+        if self.ttl > 0:
+            try:
+                result = self.results[key]
+                self.cached += 1
+                UPSTREAM_READS.labels(label, "cached").inc()
+                return result
+            except KeyError:
+                pass
+
+        # join identical request which is already in flight
+        if key in self.in_flight:
+            self.coalesced += 1
+            UPSTREAM_READS.labels(label, "coalesced").inc()
+            with span("upstream-coalesced"):
+                return self.in_flight[key].get()
+
+        pending = gevent.event.AsyncResult()
+        self.in_flight[key] = pending
+        self.sent += 1
+        UPSTREAM_READS.labels(label, "sent").inc()
+
+        try:
+            result = function()
+        except Exception as error:
+            pending.set_exception(error)
+            raise
+        else:
+            # result of a request detached by a write is handed over to its waiters only, it is not cached
+            if self.in_flight.get(key) is pending:
+                self.results.set(key, result)
+            pending.set(result)
+            return result
+        finally:
+            if self.in_flight.get(key) is pending:
+                del self.in_flight[key]
+
+            # sending greenlet has been killed - release the waiting ones
+            if not pending.ready():
+                pending.set_exception(requests.exceptions.RequestException("coalesced request has been cancelled"))
+
+    def invalidate(self, cluster):
+
+        # drop cached results of given cluster once it has been written to
+        for key in [ key for key in self.results.entries.keys() if key[0] == cluster ]:
+            del self.results.entries[key]
+
+        # reads in flight may have been answered before the write - later reads do not join them, but send a request of their own
+        for key in [ key for key in self.in_flight.keys() if key[0] == cluster ]:
+            del self.in_flight[key]
+
+    def stats(self):
+        return {
+            "in_flight": len(self.in_flight),
+            "cached_results": len(self.results.entries),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "cached": self.cached
+        }
+
+def route_template(uri):
+
+    # replace object names in API path with placeholders, so that metrics are kept per route and not per object
+    # e.g. /api/v1/namespaces/my-project/resourcequotas/compute -> /api/v1/namespaces/{name}/resourcequotas/{name}
+    match = API_PREFIX_REGEX.match(uri)
+    if not match:
+        return uri
+
+    segments = uri[match.end():].strip("/").split("/")
+    return match.group(0) + "".join(f"/{segment}" if index % 2 == 0 else "/{name}" for index, segment in enumerate(segments) if segment)
+
+def record_span(name, duration):
+
+    # spans are kept only within a request, shared by all of its greenlets
+    if flask.has_request_context() and "spans" in request_context:
+        total, count = request_context.spans.get(name, (0, 0))
+        request_context.spans[name] = (total + duration, count + 1)
+
+@contextlib.contextmanager
+def span(name):
+
+    # time a phase of the current request, can be used as a decorator as well
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        record_span(name, time.monotonic() - start)
+
+def format_spans(spans, elapsed):
+
+    # Server-Timing header value, durations are in milliseconds
+    # (durations of concurrent calls are summed, so a span might take longer than the request itself)
+    timings = [ f'{name};desc="{count} calls";dur={total * 1000:.1f}' if count > 1 else f"{name};dur={total * 1000:.1f}" for name, (total, count) in spans.items() ]
+    return ", ".join(timings + [ f"total;dur={elapsed * 1000:.1f}" ])
+
+class RequestProfiler:
+
+    def __init__(self, directory, sample_rate):
+
+        # profile a sample of requests, dumping each profile to a file in given directory
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.profiler = None
+        self.greenlet = None
+        self.previous_tracer = None
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self):
+
+        # one request at a time, the profiler is enabled only while the greenlets of the request run
+        # (greenlets share a thread and the profiler would record all of them otherwise)
+        if self.profiler is not None or random.random() >= self.sample_rate:
+            return False
+
+        self.profiler = cProfile.Profile()
+        self.greenlet = greenlet.getcurrent()
+        self.previous_tracer = greenlet.settrace(self.trace)
+        self.profiler.enable()
+        return True
+
+    def trace(self, event, args):
+
+        if event in ( "switch", "throw" ):
+            if self.is_profiled(args[1]):
+                self.profiler.enable()
+            else:
+                self.profiler.disable()
+
+        if self.previous_tracer is not None:
+            self.previous_tracer(event, args)
+
+    def is_profiled(self, target):
+
+        # greenlet of the request and greenlets spawned while handling it (such as concurrent upstream requests)
+        while target is not None:
+            if target is self.greenlet:
+                return True
+            spawning_greenlet = getattr(target, "spawning_greenlet", None)
+            target = spawning_greenlet() if spawning_greenlet is not None else None
+
+        return False
+
+    def stop(self, endpoint, elapsed):
+
+        greenlet.settrace(self.previous_tracer)
+        self.profiler.disable()
+        path = os.path.join(self.directory, f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{endpoint}-{int(elapsed * 1000)}ms.prof")
+        self.profiler.dump_stats(path)
+        self.profiler = None
+        self.greenlet = None
+
+        return path
+
+class StatsCollector:
+
+    # expose internal statistics (token cache, connection pools, watches) on scrape
+    def collect(self):
+
+        if config is None:
+            return
+
+        stats = config.stats()
+
+        token_cache_requests = CounterMetricFamily("quota_management_token_cache_requests", "Token cache lookups", labels=[ "result" ])
+        token_cache_requests.add_metric([ "hit" ], stats["token_cache"]["hits"])
+        token_cache_requests.add_metric([ "miss" ], stats["token_cache"]["misses"])
+        yield token_cache_requests
+
+        lookups = stats["token_cache"]["hits"] + stats["token_cache"]["misses"]
+        yield GaugeMetricFamily("quota_management_token_cache_hit_ratio", "Ratio of token cache lookups which were hits", value=(stats["token_cache"]["hits"] / lookups if lookups else 0))
+
+        pool_requests = CounterMetricFamily("quota_management_upstream_pool_requests", "Requests sent through connection pool", labels=[ "cluster", "connection" ])
+        pool_waits = CounterMetricFamily("quota_management_upstream_pool_waits", "Requests which waited for a free connection", labels=[ "cluster" ])
+        pool_hit_ratio = GaugeMetricFamily("quota_management_upstream_pool_hit_ratio", "Ratio of requests which reused a kept-alive connection", labels=[ "cluster" ])
+        for cluster, pool in [ ( LOCAL_CLUSTER_LABEL, stats["pools"]["local"] ), *stats["pools"]["clusters"].items() ]:
+
+            # waits for a free connection and connection reuse are not known for every engine
+            if pool["waits"] is not None:
+                pool_waits.add_metric([ cluster ], pool["waits"])
+            if pool["new_connections"] is not None:
+                pool_requests.add_metric([ cluster, "reused" ], pool["hits"])
+                pool_requests.add_metric([ cluster, "new" ], pool["new_connections"])
+                pool_hit_ratio.add_metric([ cluster ], pool["hits"] / pool["requests"] if pool["requests"] else 0)
+        yield pool_requests
+        yield pool_waits
+        yield pool_hit_ratio
+
+        informer_synced = GaugeMetricFamily("quota_management_informer_synced", "Whether watched collection is in sync", labels=[ "informer", "cluster" ])
+        informer_events = CounterMetricFamily("quota_management_informer_events", "Watch events received", labels=[ "informer", "cluster" ])
+        informer_failures = CounterMetricFamily("quota_management_informer_failures", "Failed list/watch attempts", labels=[ "informer", "cluster" ])
+        informers = [ ( "quota_managers", LOCAL_CLUSTER_LABEL, stats["informers"]["quota_managers"] ) ]
+        for kind in [ "resourcequotas", "namespaces" ]:
+            informers += [ ( kind, cluster, informer ) for cluster, informer in stats["informers"][kind].items() ]
+        for kind, cluster, informer in informers:
+            informer_synced.add_metric([ kind, cluster ], int(informer["synced"]))
+            informer_events.add_metric([ kind, cluster ], informer["events"])
+            informer_failures.add_metric([ kind, cluster ], informer["failures"])
+        yield informer_synced
+        yield informer_events
+        yield informer_failures
+
+        event_stream_subscribers = GaugeMetricFamily("quota_management_event_stream_subscribers", "Clients subscribed to the event stream", labels=[ "cluster" ])
+        for cluster, informer in stats["informers"]["resourcequotas"].items():
+            event_stream_subscribers.add_metric([ cluster ], informer["event_stream"]["subscribers"])
+        yield event_stream_subscribers
+
+        if stats["log_queue"]:
+            yield GaugeMetricFamily("quota_management_log_queue_length", "Log records waiting to be written", value=stats["log_queue"]["queued"])
+            yield CounterMetricFamily("quota_management_log_records", "Log records written", value=stats["log_queue"]["records"])
+            yield CounterMetricFamily("quota_management_log_backpressure_waits", "Times a logging greenlet waited for the log queue to drain", value=stats["log_queue"]["backpressure_waits"])
+            yield CounterMetricFamily("quota_management_log_backpressure_seconds", "Time logging greenlets spent waiting for the log queue to drain", value=stats["log_queue"]["backpressure_seconds"])
+
+def parse_list(chunks, collection):
+
+    # yield items of a JSON list object one at a time as its chunks arrive, the rest of its fields are stored in given collection
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    state = { "buffer": "", "position": 0, "finished": False }
+
+    def read():
+
+        # drop parsed part of the buffer, so that only a single item is held at a time
+        chunk = next(chunks, None)
+        state["buffer"] = state["buffer"][state["position"]:] + (text.decode(chunk) if chunk is not None else text.decode(b"", final=True))
+        state["position"] = 0
+        state["finished"] = chunk is None
+
+    def peek():
+        while True:
+            buffer, position = state["buffer"], state["position"]
+            while position < len(buffer) and buffer[position] in " \t\r\n":
+                position += 1
+            state["position"] = position
+
+            if position < len(buffer):
+                return buffer[position]
+            if state["finished"]:
+                raise ValueError("unexpected end of list")
+            read()
+
+    def expect(characters):
+        character = peek()
+        if character not in characters:
+            raise ValueError(f"expected one of '{characters}' at '{character}'")
+        state["position"] += 1
+        return character
+
+    def value():
+        peek()
+        while True:
+
+            # value is complete once it is followed by something else than a part of a number (a number might be cut off otherwise)
+            try:
+                decoded, end = decoder.raw_decode(state["buffer"], state["position"])
+                if (end < len(state["buffer"]) and state["buffer"][end] not in "+-.0123456789eE") or state["finished"]:
+                    state["position"] = end
+                    return decoded
+            except json.JSONDecodeError:
+                if state["finished"]:
+                    raise
+
+            read()
+
+    expect("{")
+    if peek() == "}":
+        return
+
+    while True:
+        key = value()
+        expect(":")
+
+        if key == "items" and peek() == "[":
+            expect("[")
+            if peek() == "]":
+                expect("]")
+            else:
+                while True:
+                    yield value()
+                    if expect(",]") == "]":
+                        break
+        else:
+            collection[key] = value()
+
+        if expect(",}") == "}":
+            return
+
+def iterate_pages(send, page_size, collection):
+
+    # items of a collection listed page by page (send makes a streamed request with given paging params),
+    # fields of the last page (such as its metadata) are stored in given collection
+    params = { "limit": page_size } if page_size > 0 else {}
+    while True:
+
+        page = {}
+        with send(params) as response:
+            yield from parse_list(response.iter_content(LIST_CHUNK_SIZE), page)
+        collection.update(page)
+
+        continue_token = (page.get("metadata") or {}).get("continue")
+        if not continue_token:
+            return
+        params = { "limit": page_size, "continue": continue_token }
+
+class ChangeFeed:
+
+    def __init__(self, size):
+
+        # recent events are kept in a ring buffer so that reconnecting subscribers can resume,
+        # event ids are prefixed by an epoch so that ids issued by another pod (or before a restart) are told apart
+        self.epoch = f"{random.getrandbits(32):08x}"
+        self.sequence = 0
+        self.buffer = collections.deque(maxlen=size)
+        self.subscribers = set()
+
+    def publish(self, kind, data):
+
+        self.sequence += 1
+        event = ( self.sequence, kind, json.dumps(data) )
+        self.buffer.append(event)
+
+        for subscriber in list(self.subscribers):
+            subscriber.put(event)
+
+            # subscriber does not keep up - end its stream, it resumes from the buffer once reconnected
+            if subscriber.qsize() > self.buffer.maxlen:
+                self.unsubscribe(subscriber)
+
+    def subscribe(self, last_event_id=None):
+
+        # events after given id, none if they are no longer (or were never) buffered and the subscriber has to re-fetch
+        backlog = []
+        if last_event_id:
+            epoch, _, sequence = last_event_id.partition("-")
+            if epoch != self.epoch or not sequence.isdigit() or int(sequence) > self.sequence:
+                backlog = None
+            elif int(sequence) < self.sequence:
+                if not self.buffer or self.buffer[0][0] > int(sequence) + 1:
+                    backlog = None
+                else:
+                    backlog = [ event for event in self.buffer if event[0] > int(sequence) ]
+
+        subscriber = gevent.queue.Queue()
+        self.subscribers.add(subscriber)
+        return subscriber, backlog
+
+    def unsubscribe(self, subscriber):
+        if subscriber in self.subscribers:
+            self.subscribers.discard(subscriber)
+            subscriber.put(None)
+
+    def close(self):
+        for subscriber in list(self.subscribers):
+            self.unsubscribe(subscriber)
+
+    def event_id(self, event):
+        return f"{self.epoch}-{event[0]}"
+
+    def stats(self):
+        return {
+            "subscribers": len(self.subscribers),
+            "published": self.sequence,
+            "buffered": len(self.buffer)
+        }
+
+class Informer:
+
+    def __init__(self, config, name, uri, cluster=None, params={}, metadata_only=False):
+
+        # list+watch of a collection on local (cluster is none) or managed cluster
+        self.config = config
+        self.uri = uri
+        self.cluster = cluster
+        self.params = params
+        self.metadata_only = metadata_only
+        self.logger = get_logger(f"{config.name}-{name}-informer")
+
+        self.resource_version = None
+        self.synced = False
+        self.last_sync = None
+        self.last_update = None
+        self.events = 0
+        self.relists = 0
+        self.failures = 0
+        self.greenlet = None
+        self.session = None
+
+    def start(self):
+
+        # list and watch on a connection of their own, so that long-lived watches never take connections from the pool serving requests
+        self.session = self.config.create_session(self.config.clusters[self.cluster]["token"] if self.cluster else self.config.pod_token, 1)
+        self.greenlet = gevent.spawn(self.run)
+        return self
+
+    def stop(self):
+        self.greenlet.kill(block=False)
+        self.session.close()
+
+    def run(self):
+
+        consecutive_failures = 0
+
+        while True:
+            try:
+                self.list()
+                consecutive_failures = 0
+                self.watch()
+
+            # cache can not be trusted until the next successful list
+            except Exception as error:
+                self.synced = False
+                self.failures += 1
+                consecutive_failures += 1
+                self.logger.warning(f"list/watch of '{self.uri}' failed: {error}")
+                gevent.sleep(min(2 ** consecutive_failures, 60))
+
+    def list(self):
+
+        # fetch full collection page by page, items are handed over one at a time
+        collection = {}
+        headers = { "Accept": PARTIAL_METADATA_LIST_ACCEPT } if self.metadata_only else {}
+
+        def send(params):
+            return self.config.upstream_request("GET", self.uri, cluster=self.cluster, session=self.session, stream=True, headers=headers, params={ **self.params, **params })
+
+        def items():
+            yield from iterate_pages(send, self.config.list_page_size, collection)
+
+            # known once the last page is parsed, before the listed items are applied
+            self.resource_version = collection["metadata"]["resourceVersion"]
+
+        self.on_list(items())
+
+        self.last_sync = self.last_update = time.monotonic()
+        self.relists += 1
+
+        if not self.synced:
+            self.logger.info(f"synced at resource version {self.resource_version}")
+        self.synced = True
+
+    def watch(self):
+
+        # watch for changes until the next periodic resync
+        resync_deadline = self.last_sync + self.config.resync_period
+        while time.monotonic() < resync_deadline:
+
+            timeout_seconds = int(resync_deadline - time.monotonic()) + 1
+            with self.config.upstream_request(  "GET", self.uri,
+                                                cluster=self.cluster,
+                                                session=self.session,
+                                                stream=True,
+                                                headers={ "Accept": PARTIAL_METADATA_WATCH_ACCEPT } if self.metadata_only else {},
+                                                timeout=(10, timeout_seconds + 30),
+                                                params={
+                                                    **self.params,
+                                                    "watch": "true",
+                                                    "allowWatchBookmarks": "true",
+                                                    "resourceVersion": self.resource_version,
+                                                    "timeoutSeconds": timeout_seconds
+                                                }) as response:
+
+                for line in response.iter_lines():
+
+                    if not line:
+                        continue
+
+                    event = json.loads(line)
+
+                    # resource version is too old - relist
+                    if event["type"] == "ERROR":
+                        if event["object"].get("code") == 410:
+                            return
+                        raise Exception(event["object"].get("message"))
+
+                    self.resource_version = event["object"]["metadata"]["resourceVersion"]
+                    self.last_update = time.monotonic()
+
+                    if event["type"] != "BOOKMARK":
+                        self.on_event(event["type"], event["object"])
+                        self.events += 1
+
+    def on_list(self, items):
+        raise NotImplementedError
+
+    def on_event(self, event_type, item):
+        raise NotImplementedError
+
+    def stats(self):
+        return {
+            "synced": self.synced,
+            "resource_version": self.resource_version,
+            "seconds_since_update": round(time.monotonic() - self.last_update, 3) if self.last_update else None,
+            "events": self.events,
+            "relists": self.relists,
+            "failures": self.failures
+        }
+
+class QuotaManagersInformer(Informer):
+
+    def __init__(self, config):
+
+        # watch the single quota managers group object
+        super(QuotaManagersInformer, self).__init__(config, "quota-managers", "/apis/user.openshift.io/v1/groups",
+                                                    params={ "fieldSelector": f"metadata.name={config.quota_managers_group}" })
+        self.users = set()
+
+    def on_list(self, items):
+        items = list(items)
+        self.users = set(items[0].get("users") or []) if items else set()
+
+    def on_event(self, event_type, item):
+        self.users = set() if event_type == "DELETED" else set(item.get("users") or [])
+
+def reduce_quota(resourcequota, quota_scheme):
+
+    # keep only 'hard' and 'used' values of the parameters present in the quota scheme
+    parameters = quota_scheme["quota"].get(resourcequota["metadata"]["name"], {}).keys()
+    hard = resourcequota.get("spec", {}).get("hard", {})
+    used = resourcequota.get("status", {}).get("used", {})
+
+    return {
+        "hard": { parameter:hard[parameter] for parameter in parameters if parameter in hard },
+        "used": { parameter:used[parameter] for parameter in parameters if parameter in used }
+    }
+
+def express_quota(project_quotas, quota_scheme):
+
+    # 'hard' and 'used' values of each scheme parameter of a project in display units
+    expressed = {}
+    for quota_object_name, quota_object in quota_scheme["quota"].items():
+
+        reduced_quota = project_quotas.get(quota_object_name, { "hard": {}, "used": {} })
+        expressed[quota_object_name] = {}
+
+        for quota_parameter_name, quota_parameter in quota_object.items():
+            units = get_display_units(quota_parameter)
+            expressed[quota_object_name][quota_parameter_name] = {
+                field: quantity.convert(reduced_quota[field][quota_parameter_name], units) if quota_parameter_name in reduced_quota[field] else None
+                    for field in [ "hard", "used" ]
+            }
+            expressed[quota_object_name][quota_parameter_name]["units"] = units
+
+    return expressed
+
+class ResourceQuotaInformer(Informer):
+
+    def __init__(self, config, cluster, quota_scheme):
+
+        # watch all of the resource quotas on managed cluster
+        super(ResourceQuotaInformer, self).__init__(config, f"{cluster}-resourcequotas", "/api/v1/resourcequotas", cluster=cluster)
+
+        # reduced resource quota objects (by name) per managed namespace
+        self.quota_scheme = quota_scheme
+        self.quotas = {}
+        self.sorted_projects = []
+
+        # changes of managed projects (quota and labels) are published to event stream subscribers
+        self.feed = ChangeFeed(config.events_buffer_size)
+
+    def stop(self):
+        super(ResourceQuotaInformer, self).stop()
+        self.feed.close()
+
+    def publish(self, namespace):
+        self.feed.publish("quota", {
+            "project": namespace,
+            "resourceVersion": self.resource_version,
+            "quota": express_quota(self.quotas[namespace], self.quota_scheme) if namespace in self.quotas else None
+        })
+
+    def on_list(self, items):
+
+        quotas = {}
+        for item in items:
+            if not INFRA_PROJECTS_REGEX.match(item["metadata"]["namespace"]):
+                quotas.setdefault(item["metadata"]["namespace"], {})[item["metadata"]["name"]] = reduce_quota(item, self.quota_scheme)
+
+        previous, self.quotas = self.quotas, quotas
+        self.sorted_projects = sorted(quotas.keys())
+
+        # publish changes which were missed while the watch was down
+        if self.last_sync is not None:
+            for namespace in previous.keys() | quotas.keys():
+                if previous.get(namespace) != quotas.get(namespace):
+                    self.publish(namespace)
+
+    def on_event(self, event_type, item):
+
+        namespace = item["metadata"]["namespace"]
+        if INFRA_PROJECTS_REGEX.match(namespace):
+            return
+
+        if event_type == "DELETED":
+
+            # namespace is no longer managed once its last quota object is gone
+            if namespace in self.quotas:
+                self.quotas[namespace].pop(item["metadata"]["name"], None)
+                if not self.quotas[namespace]:
+                    del self.quotas[namespace]
+                    del self.sorted_projects[bisect.bisect_left(self.sorted_projects, namespace)]
+
+        else:
+
+            # newly managed namespace
+            if namespace not in self.quotas:
+                self.quotas[namespace] = {}
+                bisect.insort(self.sorted_projects, namespace)
+
+            self.quotas[namespace][item["metadata"]["name"]] = reduce_quota(item, self.quota_scheme)
+
+        self.publish(namespace)
+
+    def stats(self):
+        return {
+            **super(ResourceQuotaInformer, self).stats(),
+            "projects": len(self.quotas),
+            "event_stream": self.feed.stats()
+        }
+
+class NamespaceInformer(Informer):
+
+    def __init__(self, config, cluster, label_names, resourcequota_informer):
+
+        # watch all of the namespaces on managed cluster
+        super(NamespaceInformer, self).__init__(config, f"{cluster}-namespaces", "/api/v1/namespaces", cluster=cluster, metadata_only=True)
+
+        # label changes are published along with quota changes, for managed namespaces only
+        self.resourcequota_informer = resourcequota_informer
+
+        # scheme label values per namespace, namespaces per label value (inverted index) and sorted list of values per label
+        self.label_names = list(label_names)
+        self.labels = {}
+        self.namespaces = { label: {} for label in self.label_names }
+        self.sorted_values = { label: [] for label in self.label_names }
+
+    def reduce_labels(self, namespace):
+
+        # only valid values of scheme labels
+        namespace_labels = namespace["metadata"].get("labels") or {}
+        return { label: namespace_labels[label] for label in self.label_names if namespace_labels.get(label, "") }
+
+    def add_namespace(self, name, labels):
+
+        if INFRA_PROJECTS_REGEX.match(name):
+            return
+
+        self.labels[name] = labels
+
+        for label, value in self.labels[name].items():
+
+            # first namespace with this value
+            if value not in self.namespaces[label]:
+                self.namespaces[label][value] = set()
+                bisect.insort(self.sorted_values[label], value)
+
+            self.namespaces[label][value].add(name)
+
+    def remove_namespace(self, name):
+
+        for label, value in self.labels.pop(name, {}).items():
+
+            self.namespaces[label][value].discard(name)
+
+            # last namespace with this value is gone
+            if not self.namespaces[label][value]:
+                del self.namespaces[label][value]
+                del self.sorted_values[label][bisect.bisect_left(self.sorted_values[label], value)]
+
+    def publish(self, name):
+        if name in self.resourcequota_informer.quotas:
+            self.resourcequota_informer.feed.publish("labels", {
+                "project": name,
+                "resourceVersion": self.resource_version,
+                "labels": self.labels.get(name)
+            })
+
+    def on_list(self, items):
+
+        # reduce namespaces while they are being listed, then rebuild the index at once (greenlets switch while listing)
+        namespaces = [ ( item["metadata"]["name"], self.reduce_labels(item) ) for item in items ]
+
+        previous = self.labels
+
+        self.labels = {}
+        self.namespaces = { label: {} for label in self.label_names }
+        self.sorted_values = { label: [] for label in self.label_names }
+
+        for name, labels in namespaces:
+            self.add_namespace(name, labels)
+
+        # publish changes which were missed while the watch was down
+        if self.last_sync is not None:
+            for name in previous.keys() | self.labels.keys():
+                if previous.get(name) != self.labels.get(name):
+                    self.publish(name)
+
+    def on_event(self, event_type, item):
 
-        # calculate max amount of log files
-        total_disk_space, _, _ = shutil.disk_usage(os.path.dirname(self.originalFileName))
-        maxFiles = int(total_disk_space / self.maxBytes) - 1
-        
-        # fetch all of the existing log files, sorted by creation time
-        existing_log_files = sorted(glob.glob(f"{self.originalFileName}*"), key=os.path.getctime)
+        name = item["metadata"]["name"]
+        previous = self.labels.get(name)
 
-        # if max amount of log files reached - delete oldest log file
-        while len(existing_log_files) >= maxFiles:
+        # replace previous label values of the namespace
+        self.remove_namespace(name)
+        if event_type != "DELETED":
+            self.add_namespace(name, self.reduce_labels(item))
 
-            if len(existing_log_files) == 0:
-                raise Exception("not enough disk space for an additional log file")
+        if self.labels.get(name) != previous:
+            self.publish(name)
 
-            os.remove(existing_log_files.pop(0))
+    def stats(self):
+        return {
+            **super(NamespaceInformer, self).stats(),
+            "label_values": { label: len(values) for label, values in self.namespaces.items() }
+        }
 
 class Config:
 
@@ -139,9 +1475,11 @@ class Config:
                     "api": { "type": "string" },
                     "production": { "type": "boolean" },
                     "scheme": { "type": "string" },
-                    "token": { "type": "string" }
+                    "token": { "type": "string" },
+                    "poolSize": { "type": "integer", "minimum": 1 }
                 }
             }
+            cluster_file_validator = compile_validator(cluster_file)
 
             # user object name validation
             username = \
@@ -149,6 +1487,7 @@ class Config:
                 "type": "string",
                 "pattern": "^[^/%\s]+$"
             }
+            username_validator = compile_validator(username)
 
             # namespace name validation
             namespace = \
@@ -158,6 +1497,24 @@ class Config:
                 "minLength": 2,
                 "maxLength": 63
             }
+            namespace_validator = compile_validator(namespace)
+
+            # bulk quota update request body
+            bulk_update = \
+            {
+                "type": "array",
+                "minItems": 1,
+                "items": {
+                    "type": "object",
+                    "additionalProperties": False,
+                    "required": [ "project", "scheme" ],
+                    "properties": {
+                        "project": { "type": "string" },
+                        "scheme": { "type": "object" }
+                    }
+                }
+            }
+            bulk_update_validator = compile_validator(bulk_update)
 
             # valid data types for quota params
             data_types = \
@@ -216,6 +1573,7 @@ class Config:
                     }
                 }
             }
+            scheme_file_validator = compile_validator(scheme_file)
 
             def __init__(self, name, quota, quota_name):
 
@@ -225,10 +1583,10 @@ class Config:
                 try:
 
                     # validate against schema
-                    jsonschema.validate(instance=quota, schema=self.scheme_file)
+                    validate_instance(self.scheme_file_validator, quota)
 
                 except jsonschema.ValidationError as error:
-                    schema_logger.critical(f"quota scheme file does not conform to schema: {error}")
+                    raise ConfigError(f"'{quota_name}' quota scheme file does not conform to schema: {error.message}")
 
                 schema_logger.info("quota scheme validated")
 
@@ -300,6 +1658,9 @@ class Config:
                     }
                 }
 
+                # prepare user input validator once, it is reused on every quota update
+                self.quota_validator = compile_validator(self.quota_schema)
+
                 # store original quota scheme
                 self.quota = quota
 
@@ -307,6 +1668,11 @@ class Config:
 
     def __init__(self, name):
 
+        # time each of the startup phases
+        self.startup = StartupReport()
+        self.startup.mark("module setup")
+        self.ready = False
+
         # config loader logger
         config_logger = get_logger(f"{name}-config-loader")
 
@@ -326,240 +1692,963 @@ class Config:
             self.clusters_dir = os.environ["CLUSTERS_DIR"]
             self.quota_managers_group = os.environ["QUOTA_MANAGERS_GROUP"]
             self.insecure_requests = os.environ["INSECURE_REQUESTS"]
+            self.pool_size = int(os.environ.get("UPSTREAM_POOL_SIZE", default=10))
+            self.pool_timeout = float(os.environ.get("UPSTREAM_POOL_TIMEOUT", default=30))
+            self.upstream_engine = os.environ.get("UPSTREAM_ENGINE", default="requests")
+            self.token_cache = ExpiringCache(int(os.environ.get("TOKEN_CACHE_SIZE", default=1024)), float(os.environ.get("TOKEN_CACHE_TTL", default=60)))
+            self.token_cache_negative_ttl = float(os.environ.get("TOKEN_CACHE_NEGATIVE_TTL", default=5))
+            self.upstream_reads = SingleFlight(float(os.environ.get("UPSTREAM_READ_TTL", default=0)))
+            self.resync_period = float(os.environ.get("INFORMER_RESYNC_PERIOD", default=300))
+            self.upstream_concurrency = int(os.environ.get("UPSTREAM_CONCURRENCY", default=4))
+            self.bulk_concurrency = int(os.environ.get("BULK_CONCURRENCY", default=8))
+            self.cluster_timeout = float(os.environ.get("CLUSTER_TIMEOUT", default=10))
+            self.compression_threshold = int(os.environ.get("COMPRESSION_THRESHOLD", default=1024))
+            self.log_queue_size = int(os.environ.get("LOG_QUEUE_SIZE", default=10000))
+            self.config_poll_interval = float(os.environ.get("CONFIG_POLL_INTERVAL", default=10))
+            self.events_buffer_size = int(os.environ.get("EVENTS_BUFFER_SIZE", default=1000))
+            self.events_heartbeat_interval = float(os.environ.get("EVENTS_HEARTBEAT_INTERVAL", default=15))
+            self.events_stream_duration = float(os.environ.get("EVENTS_STREAM_DURATION", default=300))
+            self.list_page_size = int(os.environ.get("LIST_PAGE_SIZE", default=500))
+            self.slow_request_threshold = float(os.environ.get("SLOW_REQUEST_THRESHOLD", default=2))
+            self.profiler = RequestProfiler(os.environ["PROFILE_DIR"], float(os.environ.get("PROFILE_SAMPLE_RATE", default=0.01))) if os.environ.get("PROFILE_DIR") else None
         except KeyError as error:
             config_logger.critical(f"one of the environment variables is not defined: {error}")
+        except ValueError as error:
+            config_logger.critical(f"one of the environment variables has an invalid value: {error}")
+
+        # make sure upstream engine is available
+        if self.upstream_engine not in UPSTREAM_ENGINES:
+            config_logger.critical(f"'{self.upstream_engine}' upstream engine is not one of: {list(UPSTREAM_ENGINES.keys())}")
+        if self.upstream_engine == "httpx" and httpx is None:
+            config_logger.critical("'httpx' upstream engine requires the httpx package to be installed")
 
         config_logger.info("environment variables parsed")
+        self.startup.mark("environment")
 
-        # ensure schemes dir exists
-        if not os.path.exists(self.quota_schemes_dir):
-            config_logger.critical(f"schemes directory is not present at '{self.quota_schemes_dir}'")
+        # parse schemes and clusters
+        try:
+            self.schemes = self.load_schemes(config_logger.name)
+            config_logger.info(f"{len(self.schemes)} schemes registered")
+            self.startup.mark("schemes")
 
-        # parse schemes
-        self.schemes = {}
-        for scheme in os.listdir(self.quota_schemes_dir):
+            self.clusters = self.load_clusters(self.schemes)
+        except ConfigError as error:
+            config_logger.critical(error)
 
-            # ignore hidden files
-            if not scheme.startswith("."):
+        config_logger.info(f"{len(self.clusters)} clusters registered")
+        self.startup.mark("clusters")
 
-                try:
-                    with open(os.path.join(self.quota_schemes_dir, scheme)) as scheme_file:
-                        
-                        # read, validate and store
-                        scheme_json = json.loads(scheme_file.read())
-                        self.schemes[scheme] = self.Schema(config_logger.name, scheme_json, scheme)
+        # parse insecure requests setting
+        if self.insecure_requests.lower() == "true":
+            config_logger.warning("running in insecure requests mode, remote cluster certificates won't be checked!")
+            requests.packages.urllib3.disable_warnings(requests.packages.urllib3.exceptions.InsecureRequestWarning)
+            self.insecure_requests = True
+        else:
+            self.insecure_requests = False
 
-                except json.JSONDecodeError as error:
-                    config_logger.critical(f"could not parse '{scheme}' scheme file: {error}")
+        # prepare pooled keep-alive sessions for local cluster and each of the managed clusters
+        self.local_session = self.create_session(self.pod_token, self.pool_size)
+        self.sessions = {}
+        self.resourcequota_informers = {}
+        self.namespace_informers = {}
+        self.sessions, self.resourcequota_informers, self.namespace_informers, _ = self.connect_clusters(self.clusters, self.schemes)
 
-        config_logger.info(f"{len(self.schemes)} schemes registered")
+        config_logger.info(f"upstream connection pools of size {self.pool_size} created using '{self.upstream_engine}' engine")
 
-        # ensure clusters dir exists
-        if not os.path.exists(self.clusters_dir):
-            config_logger.critical(f"clusters directory is not present at '{self.clusters_dir}'")
+        # keep quota managers group membership in memory
+        self.quota_managers = QuotaManagersInformer(self).start()
 
-        # parse clusters
-        self.clusters = {}
-        for cluster in os.listdir(self.clusters_dir):
+        # keep managed namespaces and scheme label values of each cluster in memory
+        for informer in [ *self.resourcequota_informers.values(), *self.namespace_informers.values() ]:
+            informer.start()
 
-            # ignore hidden files
-            if not cluster.startswith("."):
+        self.startup.mark("connections")
 
-                try:
-                    with open(os.path.join(self.clusters_dir, cluster)) as cluster_file:
-                        
-                        # read, validate
-                        cluster_json = json.loads(cluster_file.read())
-                        jsonschema.validate(instance=cluster_json, schema=self.Schema.cluster_file)
+        # prepare general logger
+        self.logger = get_logger(self.name)
+
+        # configure persistent logging if specified
+        self.log_handler = None
+        if os.environ.get("LOG_STORAGE", default=False):
+
+            self.log_handler = QuotaLogFileHandler(os.environ["LOG_STORAGE"], get_logger(f"{self.name}-log-writer"), queue_size=self.log_queue_size)
+            self.logger.addHandler(self.log_handler)
 
-                        # make sure requested scheme is present
-                        if cluster_json["scheme"] not in list(self.schemes.keys()):
-                            config_logger.critical(f"'{cluster}' cluster file: '{cluster_json['scheme']}' scheme is not one of: {list(self.schemes.keys())}")
+            config_logger.info(f"persistent logs configured to be stored in '{os.environ['LOG_STORAGE']}'")
 
-                        # store cluster
-                        self.clusters[cluster] = cluster_json
+        # public authentication endpoint is fetched and caches are primed in the background, while the server is already listening
+        self.oauth_endpoint = None
+        gevent.spawn(self.warm_up, config_logger)
 
-                except json.JSONDecodeError as error:
-                    config_logger.critical(f"could not parse '{cluster}' cluster file: {error}")
-                except jsonschema.ValidationError as error:
-                    config_logger.critical(f"'{cluster}' cluster file does not conform to schema: {error}")
+    def fetch_oauth_endpoint(self, logger):
+
+        # get public authentication endpoint from cluster, retry until it succeeds
+        while True:
+            try:
+                return self.upstream_request("GET", "/.well-known/oauth-authorization-server", timeout=self.cluster_timeout).json()["authorization_endpoint"]
+            except (requests.exceptions.RequestException, ValueError, KeyError) as error:
+                logger.warning(f"could not fetch authentication endpoint from cluster, retrying: {error}")
+                gevent.sleep(5)
+
+    def warm_up(self, logger):
+
+        start = time.monotonic()
+        self.oauth_endpoint = self.fetch_oauth_endpoint(logger)
+        self.startup.add("oauth endpoint", time.monotonic() - start)
+        logger.info("fetched authentication endpoint from cluster")
+
+        # give watches a chance to prime caches (and open connections to each cluster), unreachable clusters do not hold the server back
+        informers = [ self.quota_managers, *self.resourcequota_informers.values(), *self.namespace_informers.values() ]
+        deadline = start + self.cluster_timeout
+        while not all(informer.synced for informer in informers) and time.monotonic() < deadline:
+            gevent.sleep(0.05)
+
+        self.startup.add("warmup", time.monotonic() - start)
+        synced = sum(informer.synced for informer in informers)
+
+        # ready to serve
+        self.ready = True
+        self.startup.ready()
+        logger.info(f"ready {self.startup.ready_after:.3f}s after start ({synced}/{len(informers)} watches synced): {self.startup.format()}")
+
+    def load_schemes(self, logger_name, previous={}):
+
+        # compiled scheme is reused as long as its file has not changed
+        schemes = {}
+        for scheme, scheme_json in read_config_files(self.quota_schemes_dir, "scheme").items():
+            if scheme in previous and previous[scheme].quota == scheme_json:
+                schemes[scheme] = previous[scheme]
+            else:
+                schemes[scheme] = self.Schema(logger_name, scheme_json, scheme)
+
+        return schemes
+
+    def load_clusters(self, schemes):
+
+        clusters = read_config_files(self.clusters_dir, "cluster")
+        for cluster, cluster_json in clusters.items():
+
+            # validate
+            try:
+                validate_instance(self.Schema.cluster_file_validator, cluster_json)
+            except jsonschema.ValidationError as error:
+                raise ConfigError(f"'{cluster}' cluster file does not conform to schema: {error.message}")
+
+            # make sure requested scheme is present
+            if cluster_json["scheme"] not in list(schemes.keys()):
+                raise ConfigError(f"'{cluster}' cluster file: '{cluster_json['scheme']}' scheme is not one of: {list(schemes.keys())}")
 
         # make sure there is at least one cluster provided
-        if len(self.clusters) < 1:
-            config_logger.critical(f"no clusters were provided")
+        if len(clusters) < 1:
+            raise ConfigError("no clusters were provided")
 
-        config_logger.info(f"{len(self.clusters)} clusters registered")
+        return clusters
 
-        # parse insecure requests setting
-        if self.insecure_requests.lower() == "true":
-            config_logger.warning("running in insecure requests mode, remote cluster certificates won't be checked!")
-            requests.packages.urllib3.disable_warnings(requests.packages.urllib3.exceptions.InsecureRequestWarning)
-            self.insecure_requests = True
+    def connect_clusters(self, clusters, schemes):
+
+        sessions = {}
+        resourcequota_informers = {}
+        namespace_informers = {}
+        reused = []
+
+        for name, cluster in clusters.items():
+
+            # keep connection pool (and watched state) of clusters which have not changed
+            previous = self.clusters.get(name, {})
+            same_connection = name in self.sessions and all(previous.get(key) == cluster.get(key) for key in [ "api", "token", "poolSize" ])
+            same_scheme = same_connection and previous["scheme"] == cluster["scheme"] and self.schemes[previous["scheme"]] is schemes[cluster["scheme"]]
+
+            sessions[name] = self.sessions[name] if same_connection else self.create_session(cluster["token"], cluster.get("poolSize", self.pool_size))
+
+            if same_scheme:
+                resourcequota_informers[name] = self.resourcequota_informers[name]
+                namespace_informers[name] = self.namespace_informers[name]
+                reused.append(name)
+            else:
+                resourcequota_informers[name] = ResourceQuotaInformer(self, name, schemes[cluster["scheme"]].quota)
+                namespace_informers[name] = NamespaceInformer(self, name, schemes[cluster["scheme"]].quota["labels"].keys(), resourcequota_informers[name])
+
+        return sessions, resourcequota_informers, namespace_informers, reused
+
+    def reload(self):
+
+        reload_logger = get_logger(f"{self.name}-config-reloader")
+
+        # parse and compile new configuration aside, current one stays in use if the new one is invalid
+        try:
+            schemes = self.load_schemes(reload_logger.name, previous=self.schemes)
+            clusters = self.load_clusters(schemes)
+        except ConfigError as error:
+            reload_logger.error(f"new configuration was rejected, keeping the current one: {error}")
+            return False
+
+        sessions, resourcequota_informers, namespace_informers, reused = self.connect_clusters(clusters, schemes)
+
+        retired_sessions = [ session for name, session in self.sessions.items() if sessions.get(name) is not session ]
+        retired_informers = [ informer for name, informer in [ *self.resourcequota_informers.items(), *self.namespace_informers.items() ] if name not in reused ]
+
+        # swap configuration at once - there is no greenlet switch in between,
+        # so each request sees either the previous or the new configuration as a whole
+        self.schemes = schemes
+        self.clusters = clusters
+        self.sessions = sessions
+        self.resourcequota_informers = resourcequota_informers
+        self.namespace_informers = namespace_informers
+
+        for informer in retired_informers:
+            informer.stop()
+        for name in clusters.keys():
+            if name not in reused:
+                resourcequota_informers[name].start()
+                namespace_informers[name].start()
+
+        # let in-flight requests finish using the connections of retired sessions
+        for session in retired_sessions:
+            gevent.spawn_later(60, session.close)
+
+        reload_logger.info(f"configuration reloaded: {len(schemes)} schemes, {len(clusters)} clusters ({len(reused)} of which kept their watches)")
+        return True
+
+    def create_session(self, token, pool_size):
+
+        # upstream session of configured engine keeps connections to the API server alive between requests
+        return UPSTREAM_ENGINES[self.upstream_engine](token, pool_size, self.pool_timeout, False if self.insecure_requests else "/etc/ssl/certs/ca-certificates.crt")
+
+    def stats(self):
+        return {
+            "startup": self.startup.stats(),
+            "pools": {
+                "engine": self.upstream_engine,
+                "local": self.local_session.stats(),
+                "clusters": { name: session.stats() for name, session in self.sessions.items() }
+            },
+            "token_cache": self.token_cache.stats(),
+            "upstream_reads": self.upstream_reads.stats(),
+            "log_queue": self.log_handler.stats() if self.log_handler else None,
+            "informers": {
+                "quota_managers": self.quota_managers.stats(),
+                "resourcequotas": { name: informer.stats() for name, informer in self.resourcequota_informers.items() },
+                "namespaces": { name: informer.stats() for name, informer in self.namespace_informers.items() }
+            }
+        }
+
+    def upstream_request(self, method, uri, cluster=None, session=None, headers={}, timeout=60, **kwargs):
+
+        # local cluster is addressed by none, requests are sent through the connection pool of the cluster unless another session is given
+        if cluster is None:
+            api = LOCAL_API
+            session = session or self.local_session
         else:
-            self.insecure_requests = False
+            api = self.clusters[cluster]['api']
+            session = session or self.sessions[cluster]
 
-        # get public authentication endpoint from cluster
-        self.oauth_endpoint = self.api_request( "GET",
-                                                "/.well-known/oauth-authorization-server",
-                                                local=True).json()["authorization_endpoint"]
+        # metric labels, watches are told apart from plain reads
+        cluster_label = cluster or LOCAL_CLUSTER_LABEL
+        verb = "WATCH" if kwargs.get("params", {}).get("watch") else method
+        route = route_template(uri)
 
-        config_logger.info("fetched authentication endpoint from cluster")
+        start = time.monotonic()
+        try:
+            with span(f"upstream-{verb.lower()}"), UPSTREAM_IN_FLIGHT.labels(cluster_label).track_inprogress():
+                response = session.request( method, api + uri,
+                                            headers=headers,
+                                            timeout=timeout,
+                                            **kwargs)
 
-        # prepare general logger
-        self.logger = get_logger(self.name)
+            response.raise_for_status()
 
-        # configure persistent logging if specified
-        if os.environ.get("LOG_STORAGE", default=False):
+        except requests.exceptions.HTTPError as error:
+            UPSTREAM_ERRORS.labels(cluster_label, verb, route, str(error.response.status_code)).inc()
 
-            quota_log_handler = QuotaLogFileHandler(os.environ["LOG_STORAGE"])
-            quota_log_handler.setFormatter(QUOTA_LOGFORMATTER)
-            self.logger.addHandler(quota_log_handler)
+            # nobody reads a streamed error response to the end - read its body (for the error message) and close it,
+            # so that the connection is returned to the pool
+            if kwargs.get("stream"):
+                try:
+                    error.response.content
+                except requests.exceptions.RequestException:
+                    pass
+                finally:
+                    error.response.close()
+            raise
+        except requests.exceptions.RequestException as error:
+            UPSTREAM_ERRORS.labels(cluster_label, verb, route, type(error).__name__).inc()
+            raise
+        finally:
+            UPSTREAM_LATENCY.labels(cluster_label, verb, route).observe(time.monotonic() - start)
 
-            config_logger.info(f"persistent logs configured to be stored in '{os.environ['LOG_STORAGE']}'")
+        return response
 
-    
-    def api_request(self, method, uri, params={}, json=None, contentType="application/json", dry_run=False, local=False):
+    def api_request(self, method, uri, params={}, json=None, contentType="application/json", dry_run=False, local=False, cluster=None, headers={}, stream=False):
 
         # distinguish between local and remote request
-        if local:
-            api = "https://openshift.default.svc:443"
-            token = self.pod_token
+        if not local and cluster is None:
+            cluster = request_context.cluster
+
+        send = functools.partial(   self.upstream_request, method, uri,
+                                    cluster=(None if local else cluster),
+                                    headers={
+                                        "Content-Type": contentType,
+                                        **headers
+                                    },
+                                    json=json,
+                                    stream=stream,
+                                    params={ **params, **( { "dryRun": "All" } if dry_run else {} ) })
+
+        # make request, identical concurrent reads are sent only once (requests are made with service account tokens, so the response is the same for all callers)
+        # streamed responses can be read only once and are therefore never shared
+        try:
+            if method == "GET" and not stream:
+                key = ( None if local else cluster, uri, tuple(sorted(params.items())), tuple(sorted(headers.items())) )
+                response = self.upstream_reads.do(key, LOCAL_CLUSTER_LABEL if local else cluster, send)
+            else:
+                response = send()
+                if not dry_run:
+                    self.upstream_reads.invalidate(None if local else cluster)
+
+        # error received from the API
+        except requests.exceptions.HTTPError as error:
+            abort(error.response.json()['message'], 502)
+
+        # error during the request itself
+        except requests.exceptions.RequestException as error:
+            self.logger.error(error)
+            abort("an unexpected error has occurred", 500)
+
+        return response
+
+class ConfigWatcher:
+
+    def __init__(self, config):
+
+        # watch schemes and clusters directories for changes and reload configuration
+        self.config = config
+        self.directories = [ config.quota_schemes_dir, config.clusters_dir ]
+        self.logger = get_logger(f"{config.name}-config-watcher")
+        self.fingerprint = self.get_fingerprint()
+        self.reloads = 0
+
+    def start(self):
+        gevent.spawn(self.run)
+        return self
+
+    def get_fingerprint(self):
+
+        # hash of the contents of all of the files (mounted files are replaced rather than modified)
+        digest = hashlib.sha256()
+        for directory in self.directories:
+            for name in sorted(os.listdir(directory)) if os.path.exists(directory) else []:
+                path = os.path.join(directory, name)
+                if not name.startswith(".") and os.path.isfile(path):
+                    with open(path, "rb") as config_file:
+                        digest.update(f"{path}\0".encode() + config_file.read() + b"\0")
+
+        return digest.hexdigest()
+
+    def check(self):
+
+        fingerprint = self.get_fingerprint()
+        if fingerprint != self.fingerprint:
+            self.logger.info("configuration files have changed, reloading")
+            self.fingerprint = fingerprint
+            self.reloads += self.config.reload()
+
+    def run(self):
+
+        while True:
+            try:
+                if inotify_simple:
+                    self.watch()
+                else:
+                    self.poll()
+
+            # fall back to polling if directories can not be watched
+            except OSError as error:
+                self.logger.warning(f"could not watch configuration directories, falling back to polling: {error}")
+                self.poll()
+
+            except Exception as error:
+                self.logger.error(f"configuration watch failed: {error}")
+                gevent.sleep(self.config.config_poll_interval)
+
+    def watch(self):
+
+        inotify = inotify_simple.INotify()
+        flags = inotify_simple.flags
+        for directory in self.directories:
+            inotify.add_watch(directory, flags.CREATE | flags.DELETE | flags.MODIFY | flags.CLOSE_WRITE | flags.MOVED_TO | flags.MOVED_FROM | flags.ATTRIB)
+
+        self.logger.info(f"watching {self.directories} for changes")
+
+        try:
+            while True:
+
+                # kubernetes updates mounted files in several steps, let all of them land before reloading
+                gevent.socket.wait_read(inotify.fileno())
+                gevent.sleep(1)
+                inotify.read(timeout=0)
+
+                self.check()
+        finally:
+            inotify.close()
+
+    def poll(self):
+
+        self.logger.info(f"polling {self.directories} for changes every {self.config.config_poll_interval} seconds")
+
+        while True:
+            gevent.sleep(self.config.config_poll_interval)
+            self.check()
+
+config = None
+app = flask.Flask(__name__, static_folder=None, template_folder=os.path.join(UI_DIR, "templates"))
+disable_auth_for_routes = []
+disable_logging_for_routes = []
+cluster_agnostic_routes = []
+prometheus_client.REGISTRY.register(StatsCollector())
+
+def track_requests_in_flight(wsgi_app):
+
+    # counted on the wsgi level, greenlets spawned by a request push (and tear down) copies of its request context
+    def tracked_wsgi_app(environ, start_response):
+        with REQUESTS_IN_FLIGHT.track_inprogress():
+            return wsgi_app(environ, start_response)
+
+    return tracked_wsgi_app
+
+app.wsgi_app = track_requests_in_flight(app.wsgi_app)
+
+def route_to_path(route):
+
+    # iterate app rules map and return matching path
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint == route:
+            return rule.rule
+
+    return None
+
+def format_response(message):
+    return { "message": message[0].upper() + message[1:] }
+
+def get_time_param(name, default):
+
+    # ISO 8601 date (and time) as timestamp
+    if name not in flask.request.args:
+        return default
+
+    try:
+        return datetime.fromisoformat(flask.request.args[name]).timestamp()
+    except ValueError:
+        abort(f"'{name}' parameter is not a valid ISO 8601 date", 400)
+
+def audit(action, username, project, **details):
+
+    # structured copy of an audit log message (logging extra), indexed by persistent log handler
+    return { "audit": { "user": username, "project": project, "cluster": request_context.cluster, "action": action, "details": details } }
+
+def abort(message, code):
+    config.logger.debug(f"responded to client: {message}")
+    flask.abort(flask.make_response(format_response(message), code ))
+
+def validate_params(request_args, args):
+
+    # abort request if one of the args was not provided
+    for arg in args:
+        if arg not in request_args:
+            abort(f"missing '{arg}' parameter", 400)
+
+@span("managers")
+def validate_quota_manager(username):
+
+    # answer from membership cache, fall back to fetching the group while the watch is broken
+    if config.quota_managers.synced:
+        managers_list = config.quota_managers.users
+    else:
+        managers_list = config.api_request( "GET",
+                                            f"/apis/user.openshift.io/v1/groups/{config.quota_managers_group}", local=True).json()["users"] or []
+
+    # make sure user can manage quota
+    if username not in managers_list:
+        abort(f"user '{username}' is not allowed to manage project quota", 401)
+
+def validate_cluster(cluster):
+
+    if cluster not in config.clusters.keys():
+        abort(f"cluster '{cluster}' is not a valid cluster", 400)
+
+@span("project-lookup")
+def validate_namespace(namespace):
+
+    # answer from resource quota cache, fall back to listing quotas while the watch is broken
+    informer = config.resourcequota_informers[request_context.cluster]
+    if informer.synced:
+        managed = namespace in informer.quotas
+    else:
+        managed = namespace in get_project_list()["projects"]
+
+    # make sure namespace has quota objects
+    if not managed:
+        abort(f"project '{namespace}' is not managed", 400)
+
+def copy_request_context(call):
+
+    # greenlets do not inherit the request context, copy it (along with its globals) for the greenlet
+    request_globals = vars(request_context._get_current_object()).copy()
+
+    @flask.copy_current_request_context
+    def call_in_request_context():
+
+        vars(request_context._get_current_object()).update(request_globals)
+
+        # return errors instead of raising them so they can be handled by the caller
+        try:
+            return call(), None
+        except Exception as error:
+            return None, error
+
+    return call_in_request_context
+
+def run_concurrently(calls, pool_size=None):
+
+    # run calls in a bounded greenlet pool and wait for all of them to finish
+    pool = gevent.pool.Pool(pool_size or config.upstream_concurrency)
+    greenlets = [ pool.spawn(copy_request_context(call)) for call in calls ]
+    gevent.joinall(greenlets)
+
+    # list of (result, error) tuples in the order of given calls
+    return [ greenlet.value for greenlet in greenlets ]
+
+def iterate_concurrently(calls, pool_size):
+
+    # run calls in a bounded greenlet pool, (result, error) tuples are yielded as soon as calls finish
+    pool = gevent.pool.Pool(pool_size)
+    return pool.imap_unordered(lambda call: call(), [ copy_request_context(call) for call in calls ])
+
+def gather(calls):
+
+    results = run_concurrently(calls)
+
+    # raise the first error that occurred
+    for _, error in results:
+        if error is not None:
+            raise error
+
+    return [ result for result, _ in results ]
+
+def describe_error(error):
+
+    # status code and message that would have been returned to the client for given error
+    if isinstance(error, HTTPException):
+        return error.response.status_code, error.response.get_json()["message"]
+
+    config.logger.error(error)
+    return 500, format_response("an unexpected error has occurred")["message"]
+
+def fan_out(function):
+
+    def call_for_cluster(cluster):
+
+        # scope request context to the cluster
+        request_context.cluster = cluster
+        request_context.cluster_quota_scheme = config.schemes[config.clusters[cluster]["scheme"]].quota
+
+        # give up on the cluster once timeout expires
+        with gevent.Timeout(config.cluster_timeout, False):
+            return function()
+
+        abort(f"cluster '{cluster}' did not respond within {config.cluster_timeout} seconds", 504)
+
+    # query all of the clusters at once
+    clusters = list(config.clusters.keys())
+    results = run_concurrently([ functools.partial(call_for_cluster, cluster) for cluster in clusters ], pool_size=len(clusters))
+
+    # partial results, failed clusters are marked with an error
+    aggregated = {}
+    for cluster, (result, error) in zip(clusters, results):
+        if error is None:
+            aggregated[cluster] = result
         else:
-            api = self.clusters[request_context.cluster]['api']
-            token = self.clusters[request_context.cluster]['token']
+            status, message = describe_error(error)
+            aggregated[cluster] = { "error": { "status": status, "message": message } }
+
+    return aggregated
+
+def get_display_units(quota_parameter):
+
+    # first of the allowed units is used for display
+    config_units = quota_parameter["units"]
+    return config_units[0] if isinstance(config_units, list) else config_units
+
+def get_request_json(request):
+
+    # try reading json body and take care of badrequest exception
+    try:
+        return request.get_json(force=True)
+    except BadRequest:
+        abort("invalid JSON data in request body", 400)
+
+def get_project_list():
+
+    # answer from resource quota cache if it is in sync
+    informer = config.resourcequota_informers[request_context.cluster]
+    if informer.synced:
+        return {
+            "projects": list(informer.sorted_projects)
+        }
 
-        # make request
+    # query API (metadata of quota objects suffices)
+    projects = set()
+    for resourcequota in iterate_list("/api/v1/resourcequotas", metadata_only=True):
+        if not INFRA_PROJECTS_REGEX.match(resourcequota["metadata"]["namespace"]):
+            projects.add(resourcequota["metadata"]["namespace"])
+
+    # return project names
+    return {
+        "projects": sorted(projects)
+    }
+
+def get_project_query():
+
+    args = flask.request.args
+
+    # label selector of scheme label values (e.g. 'unit=a,team=b')
+    selector = {}
+    for requirement in filter(None, args.get("labelSelector", "").split(",")):
+        label, separator, value = requirement.partition("=")
+        if not separator:
+            abort(f"label selector requirement '{requirement}' is not of the form 'label=value'", 400)
+        if label not in request_context.cluster_quota_scheme["labels"]:
+            abort(f"label '{label}' is not part of the quota scheme", 400)
+        selector[label] = value
+
+    if args.get("sort", "name") not in [ "name", "-name" ]:
+        abort("'sort' parameter must be one of: name, -name", 400)
+
+    limit = None
+    if "limit" in args:
         try:
-            response = requests.request(method, api + uri, headers={
-                "Authorization": f"Bearer {token}",
-                "Content-Type": contentType,
-                "Accept": "application/json",
-                "Connection": "close"
-            },
-            timeout=60,
-            verify=(False if self.insecure_requests else "/etc/ssl/certs/ca-certificates.crt"),
-            json=json,
-            params={ **params, **( { "dryRun": "All" } if dry_run else {} ) })
+            limit = int(args["limit"])
+        except ValueError:
+            abort("'limit' parameter is not a number", 400)
+        if limit < 1:
+            abort("'limit' parameter must be a positive number", 400)
+
+    # continue token is the name of the last returned project
+    after = None
+    if args.get("continue"):
+        try:
+            after = base64.b64decode(args["continue"], altchars=b"-_", validate=True).decode()
+        except ValueError:
+            abort("'continue' parameter is not a valid continue token", 400)
+
+    return {
+        "search": args.get("search", "").lower(),
+        "prefix": args.get("prefix", ""),
+        "selector": selector,
+        "descending": args.get("sort") == "-name",
+        "limit": limit,
+        "after": after
+    }
+
+def search_projects(query):
+
+    # sorted project names and inverted label index from the caches if they are in sync, listed otherwise
+    resourcequota_informer = config.resourcequota_informers[request_context.cluster]
+    if resourcequota_informer.synced:
+        names, managed = resourcequota_informer.sorted_projects, resourcequota_informer.quotas
+    else:
+        names = get_project_list()["projects"]
+        managed = set(names)
+
+    namespace_informer = config.namespace_informers[request_context.cluster]
+    if not query["selector"] or namespace_informer.synced:
+        index = namespace_informer.namespaces
+    else:
+        index = { label: {} for label in query["selector"].keys() }
+        for namespace in iterate_list("/api/v1/namespaces", metadata_only=True):
+            for label in query["selector"].keys():
+                value = (namespace["metadata"].get("labels") or {}).get(label, "")
+                if value:
+                    index[label].setdefault(value, set()).add(namespace["metadata"]["name"])
+
+    prefix, after, descending = query["prefix"], query["after"], query["descending"]
+
+    if query["selector"]:
+
+        # intersect namespaces of each selected label value, starting with the smallest set
+        selected = sorted(( index[label].get(value, set()) for label, value in query["selector"].items() ), key=len)
+        labeled = set.intersection(*selected) if selected[0] else set()
+
+        matches = ( name for name in labeled if name in managed and name.startswith(prefix) and query["search"] in name and
+                    ( after is None or ( name < after if descending else name > after ) ) )
+
+        # only the requested page (and one more project) has to be ordered
+        if query["limit"]:
+            candidates = ( heapq.nlargest if descending else heapq.nsmallest )(query["limit"] + 1, matches)
+        else:
+            candidates = sorted(matches, reverse=descending)
+
+    else:
+
+        # range of sorted names which start with the prefix and follow the last returned project
+        start, end = 0, len(names)
+        if prefix:
+            start, end = bisect.bisect_left(names, prefix), bisect.bisect_right(names, prefix + "\U0010ffff")
+        if after is not None:
+            if descending:
+                end = min(end, bisect.bisect_left(names, after))
+            else:
+                start = max(start, bisect.bisect_right(names, after))
+
+        candidates = ( names[position] for position in ( range(end - 1, start - 1, -1) if descending else range(start, end) ) )
+
+        if query["search"]:
+            candidates = ( name for name in candidates if query["search"] in name )
+
+    # one more project than requested tells whether there is another page
+    projects = list(itertools.islice(candidates, query["limit"] + 1 if query["limit"] else None))
+
+    if query["limit"] and len(projects) > query["limit"]:
+        projects = projects[:query["limit"]]
+        return {
+            "projects": projects,
+            "continue": base64.urlsafe_b64encode(projects[-1].encode()).decode()
+        }
+
+    return {
+        "projects": projects
+    }
+
+def get_label_list():
+
+    # answer from namespace label index if it is in sync
+    informer = config.namespace_informers[request_context.cluster]
+    if informer.synced:
+        return { label:list(informer.sorted_values[label]) for label in request_context.cluster_quota_scheme["labels"].keys() }
+
+    # init return value
+    labels = { label:set() for label in request_context.cluster_quota_scheme["labels"].keys() }
+
+    # query API (metadata of namespaces suffices)
+    for namespace in iterate_list("/api/v1/namespaces", metadata_only=True):
+        
+        # filter infra projects
+        if not INFRA_PROJECTS_REGEX.match(namespace["metadata"]["name"]):
+
+            for label in request_context.cluster_quota_scheme["labels"].keys():
+
+                # get label value from current namespace
+                label_value = namespace["metadata"].get("labels", {}).get(label, "")
+
+                # collect valid values
+                if label_value:
+                    labels[label].add(label_value)
+
+    # return sorted values of each label
+    return { label:sorted(values) for label, values in labels.items() }
+
+def get_usage_summary():
+
+    # answer from resource quota cache if it is in sync
+    informer = config.resourcequota_informers[request_context.cluster]
+    if informer.synced:
+        quotas = informer.quotas
+    else:
+
+        # query API
+        quotas = {}
+        for resourcequota in iterate_list("/api/v1/resourcequotas"):
+            if not INFRA_PROJECTS_REGEX.match(resourcequota["metadata"]["namespace"]):
+                quotas.setdefault(resourcequota["metadata"]["namespace"], {})[resourcequota["metadata"]["name"]] = reduce_quota(resourcequota, request_context.cluster_quota_scheme)
+
+    # collect 'hard' and 'used' values of each scheme parameter over all of the managed projects
+    values = { quota_object_name:{ quota_parameter_name:{ "hard": [], "used": [] } for quota_parameter_name in quota_object.keys() }
+                for quota_object_name, quota_object in request_context.cluster_quota_scheme["quota"].items() }
+
+    for project_quotas in quotas.values():
+        for quota_object_name, reduced_quota in project_quotas.items():
+            if quota_object_name in values:
+                for field in [ "hard", "used" ]:
+                    for quota_parameter_name, value in reduced_quota[field].items():
+                        values[quota_object_name][quota_parameter_name][field].append(value)
 
-            response.raise_for_status()
+    # sum values and convert totals to display units
+    summary = { "projects": len(quotas), "quota": {} }
+    for quota_object_name, quota_object in request_context.cluster_quota_scheme["quota"].items():
 
-        # error received from the API
-        except requests.exceptions.HTTPError as error:
-            abort(error.response.json()['message'], 502)
+        summary["quota"][quota_object_name] = {}
+        for quota_parameter_name, quota_parameter in quota_object.items():
 
-        # error during the request itself
-        except requests.exceptions.RequestException as error:
-            self.logger.error(error)
-            abort("an unexpected error has occurred", 500)
+            units = get_display_units(quota_parameter)
+            parameter_values = values[quota_object_name][quota_parameter_name]
 
-        return response
+            summary["quota"][quota_object_name][quota_parameter_name] = {
+                "hard": quantity.express(quantity.total(parameter_values["hard"]), units),
+                "used": quantity.express(quantity.total(parameter_values["used"]), units),
+                "units": units
+            }
 
+    return summary
 
-config = None
-app = flask.Flask(__name__, static_folder=None, template_folder='../ui/templates')
-disable_auth_for_routes = []
-disable_logging_for_routes = []
+def iterate_list(uri, metadata_only=False):
 
-def route_to_path(route):
+    # items of a collection listed page by page and parsed one at a time, so that neither the collection nor a whole page is held at once
+    headers = { "Accept": PARTIAL_METADATA_LIST_ACCEPT } if metadata_only else {}
+    try:
+        yield from iterate_pages(lambda params: config.api_request("GET", uri, params=params, headers=headers, stream=True), config.list_page_size, {})
+
+    # error while reading the response
+    except requests.exceptions.RequestException as error:
+        config.logger.error(error)
+        abort("an unexpected error has occurred", 500)
+    except ValueError as error:
+        config.logger.error(f"invalid list of '{uri}' received: {error}")
+        abort("invalid response received from the API", 502)
+
+def get_utilisation(hard, used):
+
+    # fraction of hard quota which is used, none for quota without a hard limit
+    if hard is None:
+        return None
+    if hard == 0:
+        return float("inf") if used else 0.0
+
+    return float(used / hard)
+
+def get_report(group_by):
+
+    scheme = request_context.cluster_quota_scheme
+
+    # reduced quota objects per project - from resource quota cache if it is in sync, otherwise listed page by page
+    informer = config.resourcequota_informers[request_context.cluster]
+    if informer.synced:
+        quotas = informer.quotas
+    else:
+        quotas = {}
+        for resourcequota in iterate_list("/api/v1/resourcequotas"):
+            if not INFRA_PROJECTS_REGEX.match(resourcequota["metadata"]["namespace"]):
+                quotas.setdefault(resourcequota["metadata"]["namespace"], {})[resourcequota["metadata"]["name"]] = reduce_quota(resourcequota, scheme)
+
+    # scheme label values per project, only needed for grouping
+    labels = {}
+    if group_by:
+        informer = config.namespace_informers[request_context.cluster]
+        if informer.synced:
+            labels = informer.labels
+        else:
+            for namespace in iterate_list("/api/v1/namespaces", metadata_only=True):
+                namespace_labels = namespace["metadata"].get("labels") or {}
+                labels[namespace["metadata"]["name"]] = { label: namespace_labels[label] for label in group_by if namespace_labels.get(label, "") }
 
-    # iterate app rules map and return matching path
-    for rule in app.url_map.iter_rules():
-        if rule.endpoint == route:
-            return rule.rule
+    # group projects, each project is a group of its own unless grouped by labels
+    groups = {}
+    for project in quotas.keys():
+        key = tuple(labels.get(project, {}).get(label, "") for label in group_by) if group_by else project
+        groups.setdefault(key, []).append(project)
 
-    return None
+    # sum 'hard' and 'used' values of each scheme parameter over projects of each group
+    rows = []
+    for key, projects in groups.items():
 
-def normalize_decimal(decimal):
+        values = {}
+        for quota_object_name, quota_object in scheme["quota"].items():
+            for quota_parameter_name in quota_object.keys():
 
-    # strip trailing zeroes and format as float
-    return '{:f}'.format(decimal.normalize())
+                hard = [ quotas[project][quota_object_name]["hard"][quota_parameter_name] for project in projects
+                            if quota_parameter_name in quotas[project].get(quota_object_name, {}).get("hard", {}) ]
+                used = [ quotas[project][quota_object_name]["used"][quota_parameter_name] for project in projects
+                            if quota_parameter_name in quotas[project].get(quota_object_name, {}).get("used", {}) ]
 
-def format_response(message):
-    return { "message": message[0].upper() + message[1:] }
+                values[( quota_object_name, quota_parameter_name )] = ( quantity.total(hard) if hard else None, quantity.total(used) )
 
-def abort(message, code):
-    config.logger.debug(f"responded to client: {message}")
-    flask.abort(flask.make_response(format_response(message), code ))
+        utilisation = max([ utilisation for utilisation in ( get_utilisation(hard, used) for hard, used in values.values() ) if utilisation is not None ], default=0.0)
+        rows.append(( utilisation, key, len(projects), values ))
 
-def validate_params(request_args, args):
+    # most utilised first
+    rows.sort(key=lambda row: ( -row[0], row[1] ))
+    return rows
 
-    # abort request if one of the args was not provided
-    for arg in args:
-        if arg not in request_args:
-            abort(f"missing '{arg}' parameter", 400)
+def format_utilisation(utilisation):
 
-def validate_quota_manager(username):
+    # utilisation of quota which is exceeded while its hard limit is zero cannot be expressed as a number
+    return None if utilisation is None or utilisation == float("inf") else round(utilisation, 4)
 
-    # fetch list of quota managers
-    managers_list = config.api_request( "GET",
-                                        f"/apis/user.openshift.io/v1/groups/{config.quota_managers_group}", local=True).json()["users"]
+def format_report_ndjson(rows, group_by):
 
-    # make sure user can manage quota
-    if type(managers_list) != list or username not in managers_list:
-        abort(f"user '{username}' is not allowed to manage project quota", 401)
+    scheme = request_context.cluster_quota_scheme
 
-def validate_cluster(cluster):
+    for utilisation, key, projects, values in rows:
 
-    if cluster not in config.clusters.keys():
-        abort(f"cluster '{cluster}' is not a valid cluster", 400)
+        quota = {}
+        for ( quota_object_name, quota_parameter_name ), ( hard, used ) in values.items():
+            units = get_display_units(scheme["quota"][quota_object_name][quota_parameter_name])
+            quota.setdefault(quota_object_name, {})[quota_parameter_name] = {
+                "hard": quantity.express(hard, units) if hard is not None else None,
+                "used": quantity.express(used, units),
+                "units": units,
+                "utilisation": format_utilisation(get_utilisation(hard, used))
+            }
 
-def validate_namespace(namespace):
-    
-    # make sure namespace has managed label
-    if namespace not in get_project_list()["projects"]:
-        abort(f"project '{namespace}' is not managed", 400)
+        row = { "labels": dict(zip(group_by, key)), "projects": projects } if group_by else { "project": key }
+        yield json.dumps({ **row, "utilisation": format_utilisation(utilisation), "quota": quota }) + "\n"
 
-def get_request_json(request):
+def format_report_csv(rows, group_by):
 
-    # try reading json body and take care of badrequest exception
-    try:
-        return request.get_json(force=True)
-    except BadRequest:
-        abort("invalid JSON data in request body", 400)
+    scheme = request_context.cluster_quota_scheme
+    parameters = [ ( quota_object_name, quota_parameter_name, get_display_units(quota_parameter) )
+                    for quota_object_name, quota_object in scheme["quota"].items()
+                    for quota_parameter_name, quota_parameter in quota_object.items() ]
 
-def get_project_list():
+    # rows are written one at a time into a reused buffer
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
 
-    # query API
-    response = config.api_request(  "GET",
-                                    "/api/v1/resourcequotas")
+    def flush():
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return data
 
-    # prepare unique list of projects with quota objects
-    projects = []
-    for resourcequota in response.json()["items"]:
-        if resourcequota["metadata"]["namespace"] not in projects and not re.match(INFRA_PROJECTS_REGEX, resourcequota["metadata"]["namespace"]):
-            projects.append(resourcequota["metadata"]["namespace"])
+    writer.writerow([ *( [ *group_by, "projects" ] if group_by else [ "project" ] ), "utilisation",
+                        *[ f"{quota_object_name}/{quota_parameter_name} {field}" + (f" ({units})" if units and field != "utilisation" else "")
+                            for quota_object_name, quota_parameter_name, units in parameters
+                            for field in [ "hard", "used", "utilisation" ] ] ])
+    yield flush()
 
-    # return project names
-    return {
-        "projects": projects
-    }
+    for utilisation, key, projects, values in rows:
 
-def get_label_list():
-    
-    # query API
-    response = config.api_request(  "GET",
-                                    "/api/v1/namespaces")
+        columns = [ *key, projects ] if group_by else [ key ]
+        columns.append(format_utilisation(utilisation))
 
-    # init return value
-    labels = { label:[] for label in request_context.cluster_quota_scheme["labels"].keys() }
+        for quota_object_name, quota_parameter_name, units in parameters:
+            hard, used = values[( quota_object_name, quota_parameter_name )]
+            columns += [ quantity.express(hard, units) if hard is not None else None, quantity.express(used, units), format_utilisation(get_utilisation(hard, used)) ]
 
-    for namespace in response.json()["items"]:
-        
-        # filter infra projects
-        if not re.match(INFRA_PROJECTS_REGEX, namespace["metadata"]["name"]):
+        writer.writerow([ "" if column is None else column for column in columns ])
+        yield flush()
 
-            for label in request_context.cluster_quota_scheme["labels"].keys():
+# report output formats (formatter, mimetype)
+REPORT_FORMATS = {
+    "ndjson": ( format_report_ndjson, "application/x-ndjson" ),
+    "csv": ( format_report_csv, "text/csv" )
+}
 
-                # get label value from current namespace
-                label_value = namespace["metadata"].get("labels", {}).get(label, "")
+@app.before_request
+def start_request_timer():
+    request_context.request_start = time.monotonic()
+    request_context.spans = {}
+    request_context.profiled = config.profiler.start() if config.profiler else False
 
-                # if value is valid and is not yet in the list
-                if label_value and label_value not in labels[label]:
-                    
-                    # insert into list and keep it sorted
-                    bisect.insort(labels[label], label_value)
+def report_request_timing(response, elapsed):
 
-    return labels
+    response.headers["Server-Timing"] = format_spans(request_context.spans, elapsed)
+
+    # log breakdown of slow requests
+    if config.slow_request_threshold and elapsed >= config.slow_request_threshold:
+        config.logger.warning(f"slow request '{flask.request.method} {flask.request.path}' ({response.status_code}) took {elapsed:.3f}s: {response.headers['Server-Timing']}")
+
+    if request_context.profiled:
+        path = config.profiler.stop(flask.request.endpoint or "none", elapsed)
+        config.logger.debug(f"request profile stored at '{path}'")
 
 @app.before_request
 def check_authorization():
@@ -568,8 +2657,10 @@ def check_authorization():
     if flask.request.endpoint in disable_auth_for_routes:
         return
 
-    # make sure cluster query param present
-    validate_params(flask.request.args, [ "cluster" ])
+    # make sure cluster query param present (unless route spans all clusters)
+    cluster_agnostic = flask.request.endpoint in cluster_agnostic_routes
+    if not cluster_agnostic:
+        validate_params(flask.request.args, [ "cluster" ])
 
     # make sure authentication token header is present
     validate_params(flask.request.headers, [ "Token" ])
@@ -578,19 +2669,31 @@ def check_authorization():
     username = get_username(flask.request.headers["Token"])
     validate_quota_manager(username)
 
+    # add quota manager's username to current request context
+    request_context.username = username
+
+    if cluster_agnostic:
+        return
+
     # make sure cluster is valid
     cluster = flask.request.args["cluster"]
     validate_cluster(cluster)
 
-    # add quota manager's username, cluster and cluster quota scheme shortcut to current request context
-    request_context.username = username
+    # add cluster and cluster quota scheme shortcut to current request context
     request_context.cluster = cluster
     request_context.cluster_quota_scheme = config.schemes[config.clusters[cluster]["scheme"]].quota
 
 @app.after_request
 def after_request(response):
     response.headers['Access-Control-Allow-Methods'] = 'GET, PUT, POST'
-    return response
+
+    # streamed responses are timed until the first byte
+    if "request_start" in request_context:
+        elapsed = time.monotonic() - request_context.request_start
+        REQUEST_LATENCY.labels(flask.request.endpoint or "none", flask.request.method, response.status_code).observe(elapsed)
+        report_request_timing(response, elapsed)
+
+    return compress_response(response)
 
 @app.errorhandler(500)
 def internal_server_error(error):
@@ -605,7 +2708,73 @@ def do_not_log(route):
     disable_logging_for_routes.append(route.__name__)
     return route
 
-def get_username(token):
+def do_not_require_cluster(route):
+    cluster_agnostic_routes.append(route.__name__)
+    return route
+
+def cache_policy(cache_control, etag=None):
+
+    def decorator(route):
+
+        @functools.wraps(route)
+        def conditional_route(*args, **kwargs):
+
+            # version tag known up front (resource version etc.) allows answering before building the response
+            version_tag = etag() if etag else None
+            if version_tag is not None and flask.request.if_none_match.contains_weak(version_tag):
+                response = flask.Response(status=304)
+                response.set_etag(version_tag)
+
+            else:
+
+                # otherwise tag the response by hash of its content
+                response = flask.make_response(route(*args, **kwargs))
+                if version_tag is not None:
+                    response.set_etag(version_tag)
+                else:
+                    response.add_etag()
+
+                response.make_conditional(flask.request)
+
+            # responses differ between users
+            response.headers["Cache-Control"] = cache_control
+            response.vary.add("Token")
+
+            return response
+
+        return conditional_route
+
+    return decorator
+
+def informer_etag(informer, kind):
+
+    # resource version of an informer in sync identifies the state of the whole collection
+    if informer.synced:
+        return f"{kind}-{informer.cluster}-{informer.resource_version}"
+
+    return None
+
+def projects_etag():
+
+    # projects filtered by labels depend on the namespaces as well
+    etag = informer_etag(config.resourcequota_informers[request_context.cluster], "projects")
+    if etag is not None and flask.request.args.get("labelSelector"):
+        namespaces_etag = labels_etag()
+        return f"{etag}-{namespaces_etag}" if namespaces_etag is not None else None
+
+    return etag
+
+def labels_etag():
+
+    # label values are returned for the label names of the quota scheme, which may change on reload while the resource version does not
+    etag = informer_etag(config.namespace_informers[request_context.cluster], "labels")
+    if etag is not None:
+        label_names = hashlib.sha256("\n".join(sorted(request_context.cluster_quota_scheme["labels"].keys())).encode()).hexdigest()[:12]
+        return f"{etag}-{label_names}"
+
+    return None
+
+def review_token(token):
 
     # review user token
     review_result = config.api_request( "POST",
@@ -620,12 +2789,31 @@ def get_username(token):
                                                 }
                                             }).json()
 
-    # return username from review
+    # return username from review (none for invalid token)
     try:
         return review_result["status"]["user"]["username"]
     except KeyError:
+        return None
+
+@span("auth")
+def get_username(token):
+
+    # tokens are cached by their hash, never in plain text
+    token_hash = hashlib.sha256(token.encode()).hexdigest()
+
+    try:
+        username = config.token_cache[token_hash]
+    except KeyError:
+
+        # review token and cache the result, invalid tokens are cached for a shorter period
+        username = review_token(token)
+        config.token_cache.set(token_hash, username, ttl=(None if username else config.token_cache_negative_ttl))
+
+    if username is None:
         abort("invalid user token", 400)
 
+    return username
+
 def get_quota(project):
 
     # fetch quota objects for given project
@@ -634,43 +2822,67 @@ def get_quota(project):
 
     return { quota_object['metadata']['name']:quota_object for quota_object in quota_objects['items'] }
 
-def get_labels(project):
+def get_namespace_labels(project):
 
     # fetch namespace object
     namespace = config.api_request( "GET",
                                     f"/api/v1/namespaces/{project}").json()
 
-    return { label:namespace["metadata"].get("labels", {}).get(label, "") for label in request_context.cluster_quota_scheme["labels"].keys() }
+    return namespace["metadata"].get("labels", {})
 
-def patch_quota(user_scheme, project, username, dry_run=False):
+def get_labels(project):
+
+    # labels of the quota scheme, missing ones are reported as empty
+    namespace_labels = get_namespace_labels(project)
+    return { label:namespace_labels.get(label, "") for label in request_context.cluster_quota_scheme["labels"].keys() }
+
+def send_patches(patches, data_key, dry_run=False):
+
+    # send given patch version of all of the patches concurrently
+    return run_concurrently([ functools.partial(config.api_request, "PATCH",
+                                                patch["uri"],
+                                                json=patch[data_key],
+                                                contentType="application/strategic-merge-patch+json",
+                                                dry_run=dry_run) for patch in patches ])
+
+@span("validation")
+def validate_user_scheme(user_scheme, description="user provided scheme"):
 
     # validate user quota scheme
     try:
-        jsonschema.validate(instance=user_scheme, schema=config.schemes[config.clusters[request_context.cluster]["scheme"]].quota_schema)
+        validate_instance(config.schemes[config.clusters[request_context.cluster]["scheme"]].quota_validator, user_scheme)
     except jsonschema.ValidationError as error:
-        abort(f"user provided scheme is invalid: {error.message}", 400)
+        abort(f"{description} is invalid: {error.message}", 400)
 
-    # patch project namespace with labels (if labeling is enabled)
-    if user_scheme["labels"]:
-
-        config.api_request( "PATCH",
-                            f"/api/v1/namespaces/{project}",
-                            json=\
-                            {
-                                "metadata": {
-                                    "labels": user_scheme["labels"]
-                                }
-                            },
-                            contentType="application/strategic-merge-patch+json",
-                            dry_run=dry_run)
+def patch_quota(user_scheme, project, username, dry_run=False):
 
-        config.logger.info(f"user '{username}' has updated the labels for project '{project}' on cluster '{request_context.cluster}': '{user_scheme['labels']}'")
+    validate_user_scheme(user_scheme)
 
-    # fetch quota objects for given project
-    quota_objects = get_quota(project)
+    # fetch quota objects and current labels for given project (previous state is kept for a rollback)
+    with span("fetch"):
+        quota_objects, namespace_labels = gather([ functools.partial(get_quota, project), functools.partial(get_namespace_labels, project) ])
 
     patches = []
-        
+
+    # patch project namespace with labels (if labeling is enabled), labels which were not set are removed on a rollback
+    if user_scheme["labels"]:
+        previous_labels = { label:namespace_labels.get(label) for label in user_scheme["labels"].keys() }
+        patches.append({
+            "uri": f"/api/v1/namespaces/{project}",
+            "data": {
+                "metadata": {
+                    "labels": user_scheme["labels"]
+                }
+            },
+            "previous": {
+                "metadata": {
+                    "labels": previous_labels
+                }
+            },
+            "message": f"user '{username}' has updated the labels for project '{project}' on cluster '{request_context.cluster}': '{user_scheme['labels']}'",
+            "audit": audit("labels", username, project, labels=user_scheme["labels"], previous=previous_labels)
+        })
+
     # iterate quota objects
     for quota_object_name in request_context.cluster_quota_scheme["quota"].keys():
 
@@ -689,65 +2901,219 @@ def patch_quota(user_scheme, project, username, dry_run=False):
                 config.logger.warning(f"'{quota_parameter_name}' not found in '.status.used' of '{quota_object_name}' resource quota object in project '{project}'")
                 used_value = "0"
 
-            used_value_decimal = parse_quantity(used_value)
-
             new_value = f"{user_scheme['quota'][quota_object_name][quota_parameter_name]['value']}{user_scheme['quota'][quota_object_name][quota_parameter_name]['units']}"
 
             # check if new quota value is smaller than currently used
-            if parse_quantity(new_value).compare(used_value_decimal) == -1:
-                abort(f"new '{ request_context.cluster_quota_scheme['quota'][quota_object_name][quota_parameter_name]['name']}' quota value is smaller than currently used - new: '{new_value}', used: '{normalize_decimal(used_value_decimal)}'", 400)
+            if quantity.compare(new_value, used_value) < 0:
+                abort(f"new '{ request_context.cluster_quota_scheme['quota'][quota_object_name][quota_parameter_name]['name']}' quota value is smaller than currently used - new: '{new_value}', used: '{quantity.normalize(quantity.parse_quantity(used_value))}'", 400)
 
             # append parameter
             parameters[quota_parameter_name] = new_value
 
-        # build new patch object
+        # build new patch object, along with the previous 'hard' values of the same parameters
+        previous_hard = quota_objects[quota_object_name]["spec"].get("hard", {})
         patches.append({
-            "name": quota_object_name,
+            "uri": f"/api/v1/namespaces/{project}/resourcequotas/{quota_object_name}",
             "data": {
                 "spec": {
                     "hard": parameters
                 }
-            }
+            },
+            "previous": {
+                "spec": {
+                    "hard": { parameter:previous_hard.get(parameter) for parameter in parameters.keys() }
+                }
+            },
+            "message": f"user '{username}' has updated the '{quota_object_name}' quota for project '{project}' on cluster '{request_context.cluster}': {parameters}",
+            "audit": audit("quota", username, project, quota=quota_object_name, hard=parameters, previous={ parameter:previous_hard.get(parameter) for parameter in parameters.keys() })
         })
 
-    # update each quota object separately
+    # preflight - make sure all of the patches would be accepted
+    with span("preflight"):
+        preflight_results = send_patches(patches, "data", dry_run=True)
+    for _, error in preflight_results:
+        if error is not None:
+            raise error
+
+    if dry_run:
+        return
+
+    # update all of the objects at once
+    with span("patch"):
+        results = send_patches(patches, "data")
+    errors = [ error for _, error in results if error is not None ]
+
+    # roll back objects that were already patched if any of the patches failed
+    if errors:
+
+        patched = [ patch for patch, (_, error) in zip(patches, results) if error is None ]
+        with span("rollback"):
+            rollback_results = send_patches(patched, "previous")
+        for patch, (_, error) in zip(patched, rollback_results):
+            if error is not None:
+                config.logger.error(f"could not roll back '{patch['uri']}' on cluster '{request_context.cluster}' to its previous state: {patch['previous']}")
+
+        config.logger.warning(f"update of project '{project}' on cluster '{request_context.cluster}' failed, {len(patched)} patched objects were rolled back")
+        raise errors[0]
+
     for patch in patches:
-        config.api_request( "PATCH",
-                            f"/api/v1/namespaces/{project}/resourcequotas/{patch['name']}",
-                            json=patch["data"],
-                            contentType="application/strategic-merge-patch+json",
-                            dry_run=dry_run)
-        if not dry_run:
-            config.logger.info(f"user '{username}' has updated the '{patch['name']}' quota for project '{project}' on cluster '{request_context.cluster}': {patch['data']['spec']['hard']}")
+        config.logger.info(patch["message"], extra=patch["audit"])
+
+# ========== COMPRESSION ==========
+
+def supported_encodings():
+    return [ "br", "gzip" ] if brotli else [ "gzip" ]
+
+def compress(data, encoding, best=False):
+
+    # static assets are compressed once and can afford the best (slowest) level
+    if encoding == "br":
+        return brotli.compress(data, quality=11 if best else 5)
+
+    return gzip.compress(data, compresslevel=9 if best else 6)
+
+def negotiate_encoding(encodings):
+
+    # most preferred encoding accepted by the client (none if the client accepts none of them)
+    return flask.request.accept_encodings.best_match(encodings)
+
+def compress_response(response):
+
+    # compress complete json responses only, streamed and file responses are passed as is
+    if response.status_code != 200 or response.mimetype != "application/json" or response.is_streamed or response.direct_passthrough or "Content-Encoding" in response.headers:
+        return response
+
+    response.vary.add("Accept-Encoding")
+
+    # small responses are not worth compressing
+    if response.content_length < config.compression_threshold:
+        return response
+
+    encoding = negotiate_encoding(supported_encodings())
+    if not encoding:
+        return response
+
+    response.set_data(compress(response.get_data(), encoding))
+    response.content_encoding = encoding
+
+    # compressed body is no longer byte-for-byte identical to the one the tag was computed for
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+    return response
+
+class StaticAssets:
+
+    def __init__(self, directory, logger):
+
+        # load the whole ui build into memory
+        self.assets = {}
+        if not os.path.exists(directory):
+            logger.warning(f"ui directory is not present at '{directory}', ui will not be served")
+            return
+
+        for root, dirs, files in os.walk(directory):
+
+            # templates are rendered per request
+            dirs[:] = [ entry for entry in dirs if not (root == directory and entry == "templates") ]
+
+            for file in files:
+                path = os.path.join(root, file)
+                self.assets[os.path.relpath(path, directory)] = self.load(path)
+
+        logger.info(f"{len(self.assets)} ui files loaded")
+
+        # files are served uncompressed until their compressed variants are ready
+        gevent.spawn(self.precompress, logger)
+
+    def precompress(self, logger):
+
+        # compression runs in native threads - both zlib and brotli release the gil, so the server keeps responding meanwhile
+        start = time.monotonic()
+        threadpool = gevent.get_hub().threadpool
+        compressible = [ asset for asset in self.assets.values() if asset["mimetype"] in COMPRESSIBLE_MIMETYPES and len(asset["data"]) >= config.compression_threshold ]
+        for asset in compressible:
+
+            # keep only compressed variants which are actually smaller
+            encodings = {}
+            for encoding in supported_encodings():
+                compressed_data = threadpool.apply(compress, (asset["data"], encoding), { "best": True })
+                if len(compressed_data) < len(asset["data"]):
+                    encodings[encoding] = compressed_data
+
+            asset["encodings"] = encodings
+
+        logger.info(f"{len(compressible)} ui files precompressed using {supported_encodings()} in {time.monotonic() - start:.3f}s")
+
+    def load(self, path):
+
+        with open(path, "rb") as asset_file:
+            data = asset_file.read()
+
+        mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+        return {
+            "data": data,
+            "encodings": {},
+            "mimetype": mimetype,
+            "etag": hashlib.sha1(data).hexdigest(),
+
+            # file names containing a content hash never change, the rest must be revalidated
+            "cache_control": "public, max-age=31536000, immutable" if HASHED_ASSET_REGEX.search(os.path.basename(path)) else "no-cache"
+        }
+
+    def serve(self, path):
+
+        asset = self.assets.get(path)
+        if asset is None:
+            raise NotFound()
+
+        encoding = negotiate_encoding(list(asset["encodings"].keys()))
+        response = flask.Response(asset["encodings"][encoding] if encoding else asset["data"], mimetype=asset["mimetype"])
+        if encoding:
+            response.content_encoding = encoding
+
+        # each encoding is a different representation of the asset
+        response.set_etag(f"{asset['etag']}-{encoding}" if encoding else asset["etag"])
+        response.headers["Cache-Control"] = asset["cache_control"]
+        response.vary.add("Accept-Encoding")
+
+        return response.make_conditional(flask.request)
 
 # ========== UI ==========
 
 @app.route("/static/<path:filename>", methods=["GET"])
 @do_not_authenticate
 def r_get_static(filename):
-    return flask.send_from_directory('../ui/static', filename)
+    return static_assets.serve(os.path.join("static", filename))
 
 @app.route("/<any('',favicon.ico):element>", methods=["GET"])
 @do_not_authenticate
 def r_get_ui(element):
-    return flask.send_from_directory('../ui', element or 'index.html')
+    return static_assets.serve(element or 'index.html')
 
 @app.route("/env.js", methods=["GET"])
 @do_not_authenticate
 def r_get_env():
+    if config.oauth_endpoint is None:
+        abort("server is starting up", 503)
     return flask.Response(flask.render_template('env.js', oauth_endpoint=config.oauth_endpoint, oauth_client_id=config.oauth_client_id), mimetype="text/javascript")
 
 # ========== API =========
 
 @app.route("/validation/project", methods=["GET"])
+@cache_policy("private, max-age=60")
 def r_get_validation_project():
     return flask.jsonify(config.Schema.namespace)
 
 @app.route("/validation/username", methods=["GET"])
+@cache_policy("private, max-age=60")
 def r_get_validation_username():
     return flask.jsonify(config.Schema.username)
 
 @app.route("/validation/scheme", methods=["GET"])
+@cache_policy("private, max-age=60")
 def r_get_validation_quota():
     return flask.jsonify(config.schemes[config.clusters[request_context.cluster]["scheme"]].quota_schema)
 
@@ -759,6 +3125,7 @@ def r_get_username():
 
 @app.route("/clusters", methods=["GET"])
 @do_not_authenticate
+@cache_policy("private, max-age=60")
 def r_get_clusters():
 
     # return jsonified cluster names with relevant info
@@ -768,16 +3135,146 @@ def r_get_clusters():
             } for name, cluster in config.clusters.items() }
 
 @app.route("/labels", methods=["GET"])
+@cache_policy("private, no-cache", etag=labels_etag)
 def r_get_labels():
 
     # return jsonified labels
     return flask.jsonify(get_label_list())
 
 @app.route("/projects", methods=["GET"])
+@cache_policy("private, no-cache", etag=projects_etag)
 def r_get_projects():
 
-    # return jsonified project names
-    return flask.jsonify(get_project_list())
+    # return jsonified project names, all of them unless searched, filtered or paginated
+    if not any(param in flask.request.args for param in [ "search", "prefix", "labelSelector", "sort", "limit", "continue" ]):
+        return flask.jsonify(get_project_list())
+
+    return flask.jsonify(search_projects(get_project_query()))
+
+@app.route("/usage", methods=["GET"])
+def r_get_usage():
+
+    # return jsonified quota usage summary
+    return flask.jsonify(get_usage_summary())
+
+@app.route("/clusters/projects", methods=["GET"])
+@do_not_require_cluster
+def r_get_clusters_projects():
+
+    # return jsonified project names of all of the clusters
+    return flask.jsonify(fan_out(get_project_list))
+
+@app.route("/clusters/labels", methods=["GET"])
+@do_not_require_cluster
+def r_get_clusters_labels():
+
+    # return jsonified labels of all of the clusters
+    return flask.jsonify(fan_out(get_label_list))
+
+@app.route("/clusters/usage", methods=["GET"])
+@do_not_require_cluster
+def r_get_clusters_usage():
+
+    # return jsonified quota usage summary of all of the clusters
+    return flask.jsonify(fan_out(get_usage_summary))
+
+@app.route("/report", methods=["GET"])
+def r_get_report():
+
+    # validate arguments
+    output_format = flask.request.args.get("format", "ndjson")
+    if output_format not in REPORT_FORMATS:
+        abort(f"'format' parameter must be one of: {', '.join(REPORT_FORMATS.keys())}", 400)
+
+    group_by = [ label for label in flask.request.args.get("groupBy", "").split(",") if label ]
+    for label in group_by:
+        if label not in request_context.cluster_quota_scheme["labels"]:
+            abort(f"label '{label}' is not part of the quota scheme", 400)
+
+    # aggregate before responding, so that upstream errors are reported with a proper status - only the formatting is streamed
+    rows = get_report(group_by)
+
+    formatter, mimetype = REPORT_FORMATS[output_format]
+    return flask.Response(flask.stream_with_context(formatter(rows, group_by)), mimetype=mimetype)
+
+@app.route("/events", methods=["GET"])
+def r_get_events():
+
+    # subscribe right away, so that no change is missed in between - resume after last received event if the client reconnects
+    feed = config.resourcequota_informers[request_context.cluster].feed
+    subscriber, backlog = feed.subscribe(flask.request.headers.get("Last-Event-ID", flask.request.args.get("lastEventId")))
+    position = f"{feed.epoch}-{feed.sequence}"
+
+    def format_event(event):
+        return f"id: {feed.event_id(event)}\nevent: {event[1]}\ndata: {event[2]}\n\n"
+
+    def generate_events():
+
+        try:
+            # client should re-fetch projects, quota and labels if its last event can not be resumed from
+            if backlog is None:
+                yield f"retry: 3000\nid: {position}\nevent: resync\ndata: {{}}\n\n"
+            else:
+                yield f"retry: 3000\nid: {position}\n\n" if not backlog else "retry: 3000\n\n"
+                for event in backlog:
+                    yield format_event(event)
+
+            # stream is ended once in a while, so that the token is reviewed again when the client reconnects
+            deadline = time.monotonic() + config.events_stream_duration
+            while time.monotonic() < deadline:
+                try:
+                    event = subscriber.get(timeout=min(config.events_heartbeat_interval, deadline - time.monotonic()))
+                except gevent.queue.Empty:
+                    yield ": heartbeat\n\n"
+                    continue
+
+                # subscriber was dropped (cluster was reconfigured or client does not keep up)
+                if event is None:
+                    return
+
+                yield format_event(event)
+
+        finally:
+            feed.unsubscribe(subscriber)
+
+    return flask.Response(flask.stream_with_context(generate_events()), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+@app.route("/history", methods=["GET"])
+@do_not_require_cluster
+def r_get_history():
+
+    if not config.log_handler:
+        abort("audit history requires persistent logging to be configured", 404)
+
+    # validate arguments
+    try:
+        limit = int(flask.request.args.get("limit", 100))
+    except ValueError:
+        abort("'limit' parameter is not a number", 400)
+    if not 1 <= limit <= 1000:
+        abort("'limit' parameter must be between 1 and 1000", 400)
+
+    since = get_time_param("since", 0)
+    until = get_time_param("until", time.time() + 1)
+
+    # sqlite is not cooperative, query audit indexes in a native thread
+    rows = gevent.get_hub().threadpool.apply(AuditIndex.query, (os.path.dirname(config.log_handler.originalFileName), flask.request.args, since, until, limit))
+
+    # return jsonified audit records, newest first
+    return flask.jsonify({
+        "records": [ {
+            "time": datetime.fromtimestamp(row[0], timezone.utc).isoformat(),
+            "user": row[1],
+            "project": row[2],
+            "cluster": row[3],
+            "action": row[4],
+            "message": row[5],
+            "details": json.loads(row[6])
+        } for row in rows ]
+    })
 
 @app.route("/projects", methods=["POST"])
 def r_post_projects():
@@ -787,8 +3284,8 @@ def r_post_projects():
 
     # ensure admin username and namespace name are valid
     try:
-        jsonschema.validate(instance=flask.request.args["admin"], schema=config.Schema.username)
-        jsonschema.validate(instance=flask.request.args["project"], schema=config.Schema.namespace)
+        validate_instance(config.Schema.username_validator, flask.request.args["admin"])
+        validate_instance(config.Schema.namespace_validator, flask.request.args["project"])
     except jsonschema.ValidationError as error:
         abort(f"'{error.instance}' is invalid: {error.message}", 400)
 
@@ -807,7 +3304,7 @@ def r_post_projects():
                             }
                         })
 
-    config.logger.info(f"user '{request_context.username}' has created a project called '{new_project}' on cluster '{request_context.cluster}'")
+    config.logger.info(f"user '{request_context.username}' has created a project called '{new_project}' on cluster '{request_context.cluster}'", extra=audit("create", request_context.username, new_project))
 
     # patch new project's quota
     patch_quota(get_request_json(flask.request), new_project, request_context.username, dry_run=False)
@@ -837,7 +3334,7 @@ def r_post_projects():
                             ]
                         })
 
-    config.logger.info(f"user '{request_context.username}' has assigned '{admin_user_name}' as admin of project '{new_project}' on cluster '{request_context.cluster}'")
+    config.logger.info(f"user '{request_context.username}' has assigned '{admin_user_name}' as admin of project '{new_project}' on cluster '{request_context.cluster}'", extra=audit("admin", request_context.username, new_project, admin=admin_user_name))
 
     return flask.jsonify(format_response(f"project '{new_project}' has been successfully created on cluster '{config.clusters[request_context.cluster]['displayName']}'")), 200
 
@@ -847,7 +3344,33 @@ def r_post_projects():
 def healthz():
     return "OK", 200
 
+@app.route("/readyz", methods=["GET"])
+@do_not_authenticate
+@do_not_log
+def readyz():
+
+    # not ready until the authentication endpoint is known and caches are primed
+    if not config.ready:
+        return "starting up", 503
+
+    return "OK", 200
+
+@app.route("/metrics", methods=["GET"])
+@do_not_authenticate
+@do_not_log
+def r_get_metrics():
+    return flask.Response(prometheus_client.generate_latest(), mimetype=prometheus_client.CONTENT_TYPE_LATEST)
+
+@app.route("/stats", methods=["GET"])
+@do_not_authenticate
+@do_not_log
+def r_get_stats():
+
+    # return jsonified internal statistics (connection pools etc.)
+    return flask.jsonify(config.stats())
+
 @app.route("/scheme", methods=["GET"])
+@cache_policy("private, max-age=60")
 def r_get_scheme():
     return flask.jsonify(request_context.cluster_quota_scheme)
 
@@ -857,12 +3380,28 @@ def r_get_quota():
     # validate arguments
     validate_params(flask.request.args, [ "project" ])
 
-    # make sure project is managed
-    validate_namespace(flask.request.args['project'])
+    # make sure project is managed before it is used in any upstream request - the resource quota cache answers right away,
+    # while it is not in sync the project name is only validated and the fetched quota objects tell whether it is managed
+    if config.resourcequota_informers[request_context.cluster].synced:
+        validate_namespace(flask.request.args['project'])
+    else:
+        try:
+            validate_instance(config.Schema.namespace_validator, flask.request.args['project'])
+        except jsonschema.ValidationError:
+            abort(f"project '{flask.request.args['project']}' is not managed", 400)
+
+    # fetch quota objects and labels for given project at the same time
+    (quota_objects, quota_error), (labels, labels_error) = run_concurrently([   functools.partial(get_quota, flask.request.args['project']),
+                                                                                functools.partial(get_labels, flask.request.args['project']) ])
+
+    if quota_error is not None:
+        raise quota_error
 
-    # fetch quota objects and labels for given project
-    quota_objects = get_quota(flask.request.args['project'])
-    labels = get_labels(flask.request.args['project'])
+    if not quota_objects or INFRA_PROJECTS_REGEX.match(flask.request.args['project']):
+        abort(f"project '{flask.request.args['project']}' is not managed", 400)
+
+    if labels_error is not None:
+        raise labels_error
 
     # prepare project quota JSON to be returned
     project_quota = \
@@ -872,34 +3411,25 @@ def r_get_quota():
     }
 
     # iterate quota objects
-    for quota_object_name in request_context.cluster_quota_scheme["quota"].keys():
-
-        project_quota["quota"][quota_object_name] = {}
-
-        # store current quota object
-        quota_object = quota_objects[quota_object_name]
+    for quota_object_name, quota_parameters in request_context.cluster_quota_scheme["quota"].items():
 
-        # iterate quota parameters
-        for quota_parameter_name in request_context.cluster_quota_scheme["quota"][quota_object_name].keys():
+        # store 'hard' values of current quota object
+        quota_hard = quota_objects[quota_object_name]["spec"].get("hard", {})
 
-            # get current value
-            try:
-                value_decimal = parse_quantity(quota_object["spec"]["hard"][quota_parameter_name])
-            except KeyError:
+        # make sure all of the scheme parameters are defined
+        for quota_parameter_name in quota_parameters.keys():
+            if quota_parameter_name not in quota_hard:
                 abort(f"quota parameter '{quota_parameter_name}' is not defined in '{quota_object_name}' resource quota in project '{flask.request.args['project']}'", 502)
 
-            # get desired units
-            config_units = request_context.cluster_quota_scheme["quota"][quota_object_name][quota_parameter_name]["units"]
-            units = config_units[0] if isinstance(config_units, list) else config_units
+        # convert the whole quota object to desired units (strip trailing zeroes, format as float)
+        units = { quota_parameter_name:get_display_units(quota_parameter) for quota_parameter_name, quota_parameter in quota_parameters.items() }
+        values = quantity.convert_quota({ quota_parameter_name:quota_hard[quota_parameter_name] for quota_parameter_name in quota_parameters.keys() }, units)
 
-            # convert to desired quantity based on units
-            value_decimal /= parse_quantity(f"1{units}")
-
-            # strip trailing zeroes, format as float and set in return JSON
-            project_quota["quota"][quota_object_name][quota_parameter_name] = {
-                "value": normalize_decimal(value_decimal),
-                "units": units
-            }
+        # set in return JSON
+        project_quota["quota"][quota_object_name] = { quota_parameter_name:{
+                                                            "value": values[quota_parameter_name],
+                                                            "units": units[quota_parameter_name]
+                                                        } for quota_parameter_name in quota_parameters.keys() }
 
     return flask.jsonify(project_quota), 200
 
@@ -917,10 +3447,53 @@ def r_put_quota():
 
     return flask.jsonify(format_response(f"quota updated successfully for project '{flask.request.args['project']}' on cluster '{config.clusters[request_context.cluster]['displayName']}'")), 200
 
+@app.route("/quota/bulk", methods=["PUT"])
+def r_put_quota_bulk():
+
+    updates = get_request_json(flask.request)
+
+    # validate request body
+    try:
+        validate_instance(config.Schema.bulk_update_validator, updates)
+    except jsonschema.ValidationError as error:
+        abort(f"bulk update is invalid: {error.message}", 400)
+
+    # make sure all of the projects are managed, listed once and all of the schemes are valid before updating anything
+    managed_projects = set(get_project_list()["projects"])
+    listed_projects = set()
+    for update in updates:
+        if update["project"] in listed_projects:
+            abort(f"project '{update['project']}' is listed more than once", 400)
+        listed_projects.add(update["project"])
+        if update["project"] not in managed_projects:
+            abort(f"project '{update['project']}' is not managed", 400)
+        validate_user_scheme(update["scheme"], description=f"scheme for project '{update['project']}'")
+
+    def update_project_quota(update):
+
+        # report outcome of a single project update
+        try:
+            patch_quota(update["scheme"], update["project"], request_context.username)
+            return { "project": update["project"], "status": 200, "message": format_response("quota updated successfully")["message"] }
+        except Exception as error:
+            status, message = describe_error(error)
+            return { "project": update["project"], "status": status, "message": message }
+
+    def generate_results():
+
+        # stream results as soon as each project is done
+        for result, _ in iterate_concurrently([ functools.partial(update_project_quota, update) for update in updates ], config.bulk_concurrency):
+            yield json.dumps(result) + "\n"
+
+    return flask.Response(flask.stream_with_context(generate_results()), mimetype="application/x-ndjson")
+
 if __name__ == "__main__":
 
     # instantiate global objects
     config = Config("quota-manager")
+    static_assets = StaticAssets(UI_DIR, get_logger(f"{config.name}-static-assets"))
+    config.startup.mark("ui")
+    ConfigWatcher(config).start()
 
     # disable dictionary sorting on flask.jsonify()
     # this way the quota scheme fields stay in the same order on client
@@ -936,4 +3509,5 @@ if __name__ == "__main__":
 
     # start server
     api_logger.info(f"listening on {listener[0]}:{listener[1]}")
+    config.startup.mark("listener")
     WSGIServer(listener, app, log=api_logger, handler_class=CustomWSGIHandler).serve_forever()
\ No newline at end of file